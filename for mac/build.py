@@ -118,7 +118,7 @@ OPTIONS = {{
     'argv_emulation': False,
     'packages': ['PyQt6', 'asyncio', 'aiohttp', 'srt', 'nest_asyncio'],
     'excludes': ['PyQt5', 'tkinter', 'matplotlib'],
-    'includes': ['early_init'],
+    'includes': ['early_init', 'subtitle_core'],
     'arch': 'universal2',
     {icon_option}
     'plist': {{
@@ -33,4 +33,5 @@ def get_pyinstaller_config():
         '--hidden-import=asyncio',
         '--hidden-import=aiohttp',
         '--hidden-import=srt',
+        '--hidden-import=subtitle_core',
     ]
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""命令行批量翻译：在一个进程中翻译多个SRT字幕文件
+
+输入可以是文件、通配符或目录（目录下的 .srt 文件）。所有文件共用同一个批次调度器、
+同一个API客户端（连接池与限速器），并发上限和速率限制对全部文件整体生效，
+小文件的批次可以填补大文件留下的空闲并发；正在翻译的同时预先读取并预处理后面的文件。
+
+用法示例：
+    python subtitle_cli.py "Season 1" --source-lang 英文 --target-lang 中文 --output-dir out
+    python subtitle_cli.py "S01/*.srt" "S02/*.srt" --concurrency 8 --no-multi-phase
+
+未在命令行指定的配置项从 --config 指定的JSON文件读取（默认为图形界面保存的配置文件）。
+"""
+import argparse
+import asyncio
+import dataclasses
+import glob
+import json
+import os
+import sys
+import time
+from typing import List
+
+from subtitle_core import TranslationConfig, TranslationEngine, APIClient, BatchDispatcher
+
+DEFAULT_CONFIG_FILE = "subtitle_translator_config.json"
+
+
+def collect_input_files(inputs: List[str], recursive: bool = False) -> List[str]:
+    """把文件、通配符和目录展开为去重后的SRT文件列表，保持输入顺序，目录内按文件名排序"""
+    files = []
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*.srt") if recursive else os.path.join(item, "*.srt")
+            matches = sorted(glob.glob(pattern, recursive=recursive))
+        elif glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=recursive))
+        else:
+            matches = [item]
+        for path in matches:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def output_path_for(input_file: str, output_dir: str, target_lang: str) -> str:
+    """输出文件路径，命名方式与图形界面相同：<原文件名>_<目标语言>.srt"""
+    directory = output_dir or os.path.dirname(input_file)
+    return os.path.join(directory, f"{os.path.splitext(os.path.basename(input_file))[0]}_{target_lang}.srt")
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """为 TranslationConfig 的每个字段添加同名命令行参数（下划线换成连字符）"""
+    group = parser.add_argument_group("翻译配置（未指定时使用配置文件中的值或默认值）")
+    for field in dataclasses.fields(TranslationConfig):
+        option = "--" + field.name.replace("_", "-")
+        if field.type is bool:
+            group.add_argument(option, dest=field.name, action=argparse.BooleanOptionalAction, default=None)
+        elif field.type in (int, float, str):
+            group.add_argument(option, dest=field.name, type=field.type, default=None, metavar=field.name.upper())
+
+
+def build_config(args) -> TranslationConfig:
+    """合并配置文件与命令行参数，命令行优先"""
+    values = {}
+    if args.config and os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        field_names = {field.name for field in dataclasses.fields(TranslationConfig)}
+        values.update({key: value for key, value in saved.items() if key in field_names})
+    elif args.config != DEFAULT_CONFIG_FILE:
+        raise SystemExit(f"错误: 找不到配置文件 {args.config}")
+
+    for field in dataclasses.fields(TranslationConfig):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = value
+
+    missing = [field.name for field in dataclasses.fields(TranslationConfig)
+               if field.default is dataclasses.MISSING and not values.get(field.name)]
+    if missing:
+        raise SystemExit("错误: 缺少必要的配置项: " + ", ".join("--" + name.replace("_", "-") for name in missing))
+    return TranslationConfig(**values)
+
+
+class BatchTranslator:
+    """多文件翻译：共享调度器和API客户端，预处理与翻译流水线并行"""
+
+    def __init__(self, config: TranslationConfig, output_dir: str = "", parallel_files: int = 3,
+                 prefetch: int = 2, verbose: bool = False):
+        """初始化
+
+        Args:
+            config: 全部文件共用的翻译配置
+            output_dir: 输出目录，为空时输出到原文件所在目录
+            parallel_files: 同时翻译的文件数
+            prefetch: 预先读取并预处理、等待翻译的文件数
+            verbose: 是否输出每个文件的详细进度
+        """
+        self.config = config
+        self.output_dir = output_dir
+        self.parallel_files = max(1, parallel_files)
+        self.prefetch = max(1, prefetch)
+        self.verbose = verbose
+        self.should_stop = False
+        self.results = []
+        self.completed = 0
+
+    def log(self, message: str):
+        print(message, flush=True)
+
+    def create_engine(self, input_file: str, api_client, dispatcher) -> TranslationEngine:
+        """为单个文件创建翻译引擎，日志带上文件名前缀"""
+        engine = TranslationEngine(self.config, api_client=api_client, dispatcher=dispatcher)
+        engine.input_file = input_file
+        engine.output_file = output_path_for(input_file, self.output_dir, self.config.target_lang)
+        name = os.path.basename(input_file)
+        engine.worker_signals.error.connect(lambda message: self.log(f"[{name}] 错误: {message}"))
+        if self.verbose:
+            engine.worker_signals.progress.connect(lambda message: self.log(f"[{name}] {message}"))
+        return engine
+
+    async def run(self, files: List[str]) -> dict:
+        """翻译全部文件，返回汇总统计"""
+        api_client = APIClient.from_config(self.config)
+        dispatcher = BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+        prepared = asyncio.Queue(maxsize=self.prefetch)
+        loop = asyncio.get_running_loop()
+
+        # 只测试一次API连接：通过后共享的客户端标记为已验证，各文件的引擎不再单独测试；
+        # 测试请求不计入吞吐量统计
+        probe = TranslationEngine(self.config, api_client=api_client, dispatcher=dispatcher)
+        probe.worker_signals.error.connect(lambda message: self.log(f"错误: {message}"))
+        if not await probe.test_api_connection():
+            await api_client.close()
+            return self.summarize(files, 0.0, dict.fromkeys(api_client.usage, 0))
+        probe_usage = dict(api_client.usage)
+        started = time.monotonic()
+
+        async def prepare_files():
+            """按顺序读取并预处理文件，预处理在线程池中进行，与正在进行的请求并行"""
+            for input_file in files:
+                if self.should_stop:
+                    break
+                if self.output_dir:
+                    os.makedirs(self.output_dir, exist_ok=True)
+                engine = self.create_engine(input_file, api_client, dispatcher)
+                engine.subtitles = await loop.run_in_executor(
+                    None, lambda: list(engine.iter_input_subtitles(engine.worker_signals))
+                )
+                await prepared.put(engine)
+            for _ in range(self.parallel_files):
+                await prepared.put(None)
+
+        async def translate_files():
+            while True:
+                engine = await prepared.get()
+                if engine is None:
+                    return
+                await self.translate_file(engine, len(files))
+
+        try:
+            await asyncio.gather(prepare_files(), *(translate_files() for _ in range(self.parallel_files)))
+        finally:
+            await api_client.close()
+
+        usage = {key: value - probe_usage.get(key, 0) for key, value in api_client.usage.items()}
+        return self.summarize(files, time.monotonic() - started, usage)
+
+    def summarize(self, files: List[str], elapsed: float, usage: dict) -> dict:
+        """汇总已翻译文件的结果与API用量"""
+        summary = {
+            "files": len(files),
+            "succeeded": sum(1 for result in self.results if result["ok"]),
+            "subtitles": sum(result["subtitles"] for result in self.results),
+            "characters": sum(result["characters"] for result in self.results),
+            "failed_subtitles": sum(result["failed"] for result in self.results),
+            "elapsed": elapsed,
+        }
+        summary.update(usage)
+        return summary
+
+    async def translate_file(self, engine: TranslationEngine, total: int):
+        """翻译单个已预处理的文件并记录结果"""
+        name = os.path.basename(engine.input_file)
+        result = {"file": engine.input_file, "ok": False, "subtitles": len(engine.subtitles),
+                  "characters": sum(len(sub["content"]) for sub in engine.subtitles), "failed": 0}
+        self.results.append(result)
+        if not engine.subtitles:
+            self.completed += 1
+            self.log(f"[{self.completed}/{total}] {name}: 没有可供翻译的字幕，已跳过")
+            return
+
+        started = time.monotonic()
+        wall_started = time.time()
+        try:
+            await engine.translate()
+        except Exception as e:
+            self.log(f"[{name}] 错误: {str(e)}")
+        result["failed"] = len(set(engine.failed_indices))
+        # 引擎在流程最后写出译文文件，文件在本次翻译开始后更新过才算成功
+        result["ok"] = os.path.exists(engine.output_file) and os.path.getmtime(engine.output_file) >= wall_started - 1
+        status = f"已输出 {engine.output_file}" if result["ok"] else "翻译失败"
+        self.completed += 1
+        self.log(f"[{self.completed}/{total}] {name}: {result['subtitles']} 条字幕，"
+                 f"失败 {result['failed']} 条，用时 {time.monotonic() - started:.1f} 秒，{status}")
+
+
+def format_summary(summary: dict) -> str:
+    """格式化汇总的吞吐量统计"""
+    elapsed = max(summary["elapsed"], 1e-6)
+    tokens = summary["prompt_tokens"] + summary["completion_tokens"]
+    return "\n".join([
+        f"文件: {summary['succeeded']}/{summary['files']} 成功",
+        f"字幕: {summary['subtitles']} 条（失败 {summary['failed_subtitles']} 条），{summary['characters']} 字符",
+        f"请求: {summary['requests']} 次，令牌 {tokens}（输入 {summary['prompt_tokens']}，输出 {summary['completion_tokens']}）",
+        f"用时: {summary['elapsed']:.1f} 秒，{summary['subtitles'] / elapsed:.1f} 条字幕/秒，"
+        f"{summary['requests'] / elapsed * 60:.1f} 请求/分钟，{tokens / elapsed * 60:.0f} 令牌/分钟",
+    ])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量翻译SRT字幕文件（所有文件共享并发上限、连接池和速率限制）")
+    parser.add_argument("inputs", nargs="+", help="SRT文件、通配符或目录")
+    parser.add_argument("-o", "--output-dir", default="", help="输出目录，默认输出到原文件所在目录")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归查找目录和通配符中的SRT文件")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help="JSON配置文件（默认为图形界面保存的配置）")
+    parser.add_argument("--parallel-files", type=int, default=3, help="同时翻译的文件数（默认3）")
+    parser.add_argument("--prefetch", type=int, default=2, help="预先预处理、等待翻译的文件数（默认2）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每个文件的详细进度")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    config = build_config(args)
+    files = collect_input_files(args.inputs, recursive=args.recursive)
+    if not files:
+        print("错误: 没有找到SRT文件", file=sys.stderr)
+        return 2
+
+    translator = BatchTranslator(config, output_dir=args.output_dir, parallel_files=args.parallel_files,
+                                 prefetch=args.prefetch, verbose=args.verbose)
+    print(f"共 {len(files)} 个文件，最大并发请求数 {config.concurrency}，同时翻译 {translator.parallel_files} 个文件", flush=True)
+    try:
+        summary = asyncio.run(translator.run(files))
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return 130
+    print(format_summary(summary), flush=True)
+    return 0 if summary["succeeded"] == summary["files"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -36,7 +36,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('assets', 'assets')],
-    hiddenimports=['PyQt6', 'asyncio', 'aiohttp', 'srt', 'nest_asyncio'],
+    hiddenimports=['PyQt6', 'asyncio', 'aiohttp', 'srt', 'nest_asyncio', 'subtitle_core'],
     hookspath=[],
     hooksconfig={{}},
     runtime_hooks=[],
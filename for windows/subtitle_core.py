@@ -0,0 +1,4768 @@
+"""字幕翻译核心：配置、字幕预处理、批量请求与响应解析、API客户端和翻译流程
+
+本模块不依赖 PyQt6，可以在没有图形界面的环境中导入使用；图形界面（subtitle_translator.py）
+只是在此之上的一层适配。
+"""
+import sys
+import os
+import re
+import random
+import json
+import asyncio
+import contextvars
+import email.utils
+import hashlib
+import itertools
+import math
+import sqlite3
+import srt
+import time
+import traceback
+from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+
+@dataclass
+class TranslationConfig:
+    """翻译配置类"""
+    source_lang: str  # 源语言
+    target_lang: str  # 目标语言
+    api_key: str  # API密钥
+    api_host: str  # API主机地址
+    model: str  # 模型名称
+    temperature: float = 0.5  # 温度系数
+    max_tokens: int = None  # 最大生成令牌数（设置后随请求发送，并用于计算批次的输出预算）
+    context_window: int = 65536  # 模型上下文窗口大小（令牌数），用于计算批次的输入预算
+    batch_size: int = 40  # 批量处理字幕数量
+    concurrency: int = 5  # 并发数量
+    delay: float = 1.0  # 被限流或重试时的基础退避时间（秒）
+    requests_per_minute: int = 0  # 每分钟请求数上限，0表示不限制（被限流时自动降速）
+    tokens_per_minute: int = 0  # 每分钟令牌数上限，0表示不限制
+    stream: bool = True  # 是否使用流式输出（SSE），逐条接收译文
+    verify_ssl: bool = True  # 是否校验API服务器的TLS证书，只有使用自签名证书的私有部署才需要关闭
+    stream_idle_timeout: float = 30.0  # 流式输出中两段数据之间的最长等待时间（秒）
+    translation_memory: bool = True  # 是否启用持久化翻译记忆，跨文件复用相同台词的译文
+    translation_memory_path: str = "translation_memory.db"  # 翻译记忆数据库路径
+    translation_memory_max_entries: int = 200000  # 翻译记忆最多保存的条目数
+    hearing_impaired_tags: str = ""  # 额外的听障标记词（逗号分隔），单独成行时与默认的 Music/笑声 等一起删除
+    structured_output: bool = False  # 是否要求模型以JSON返回批量译文（response_format），解析失败时回退到编号格式解析
+    preserve_format: bool = True  # 保留原始格式
+    netflix_style: bool = True  # Netflix风格优化字幕分段（默认启用）
+    terminology_consistency: bool = True  # 保持术语一致性（默认启用）
+    multi_phase: bool = False  # 是否使用多阶段翻译流程
+    final_review: bool = False  # 是否在翻译完成后批量审校译文（只修改模型认为有问题的行）
+    segmentation_mode: str = "llm"  # 译文断行方式（netflix_style 启用时，翻译完成后写出前进行）："llm" 由模型按Netflix风格断行，"local" 使用本地断行引擎（不调用API）
+    max_line_length: int = 0  # 本地断行时每行最多字符数，0表示按文字自动选择（中日韩16，其他42）
+    max_lines: int = 2  # 本地断行时每条字幕最多行数
+    quality_threshold: float = 0.5  # 本地质量估计的风险阈值，只有达到阈值的字幕才送去最终审校和错误校正；0表示不按风险分过滤（审校全部译文，错误校正仍只处理明确失败或多项特征异常的字幕）
+    recovery_enabled: bool = False  # 是否启用恢复功能
+    recovery_file: str = ""  # 恢复文件路径
+    enable_batching: bool = False  # 是否启用批量翻译
+    request_delay: float = 1.0  # 已废弃：请求节奏改由 requests_per_minute/tokens_per_minute 限速器控制
+    clean_punctuation: bool = False  # 是否清理标点符号
+    show_original: bool = True  # 是否显示原文
+    custom_terminology: dict = None  # 用户自定义术语字典
+    
+    def __getitem__(self, key):
+        """允许像字典一样访问配置"""
+        return getattr(self, key)
+        
+    def get(self, key, default=None):
+        """获取配置值，如果不存在则返回默认值"""
+        return getattr(self, key, default)
+
+
+class Cue:
+    """单条字幕
+
+    用 __slots__ 保存编号、文本和以整数微秒表示的起止时间（与 timedelta 精度相同，换算无损），
+    文本经过 intern，重复台词只保存一份。time_info 在访问时才由起止时间格式化。
+    保留原来的字典接口（cue["content"]、cue.get("start")、cue.copy() 等），
+    按字典访问字幕的代码无需修改；start/end 读取时返回 timedelta。
+    """
+
+    __slots__ = ("index", "content", "start_us", "end_us")
+    FIELDS = ("index", "time_info", "content", "start", "end")
+
+    def __init__(self, index: int, content: str, start_us: int, end_us: int):
+        self.index = index
+        self.content = sys.intern(content) if type(content) is str else content
+        self.start_us = start_us
+        self.end_us = end_us
+
+    @staticmethod
+    def to_microseconds(value) -> int:
+        """把 timedelta（或整数微秒）换算为整数微秒"""
+        if isinstance(value, timedelta):
+            return (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+        return int(value)
+
+    @classmethod
+    def from_srt(cls, sub, index: Optional[int] = None) -> "Cue":
+        """由 srt.Subtitle 创建，index 为空时沿用原编号"""
+        return cls(sub.index if index is None else index, sub.content,
+                   cls.to_microseconds(sub.start), cls.to_microseconds(sub.end))
+
+    @classmethod
+    def coerce(cls, value) -> "Cue":
+        """把字典形式的字幕转换为 Cue，已经是 Cue 的直接返回"""
+        if isinstance(value, cls):
+            return value
+        return cls(value["index"], value["content"], cls.to_microseconds(value["start"]), cls.to_microseconds(value["end"]))
+
+    @property
+    def start(self) -> timedelta:
+        return timedelta(microseconds=self.start_us)
+
+    @start.setter
+    def start(self, value):
+        self.start_us = self.to_microseconds(value)
+
+    @property
+    def end(self) -> timedelta:
+        return timedelta(microseconds=self.end_us)
+
+    @end.setter
+    def end(self, value):
+        self.end_us = self.to_microseconds(value)
+
+    @property
+    def time_info(self) -> str:
+        return f"{self.start} --> {self.end}"
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key == "time_info":
+            return  # 由起止时间推导，无需单独保存
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.FIELDS]
+
+    def copy(self) -> "Cue":
+        return Cue(self.index, self.content, self.start_us, self.end_us)
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Cue({self.index}, {self.content!r}, {self.time_info})"
+
+
+# 当前调度批次（run调用）的在途任务集合，供处理函数追加后续任务时定位
+_current_dispatch_run = contextvars.ContextVar("current_dispatch_run", default=None)
+
+
+class BatchDispatcher:
+    """有界并发批次调度器
+
+    最多同时保持 concurrency 个批次请求在途，结果按任务序号写回，
+    乱序完成的批次也能落到正确的位置。同一个调度器可以被多个 run() 共享，
+    共享的信号量即为全局并发上限。
+    """
+
+    def __init__(self, concurrency: int = 5, should_stop=None):
+        """初始化调度器
+
+        Args:
+            concurrency: 最大在途请求数
+            should_stop: 可选的无参函数，返回True时不再启动新的批次
+        """
+        self.concurrency = max(1, int(concurrency or 1))
+        self.should_stop = should_stop
+        self._semaphore = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """延迟创建信号量，确保绑定到当前运行的事件循环"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _run_job(self, handler, job, delay: float = 0):
+        """在并发槽位内执行单个任务，delay 秒的等待不占用并发槽位"""
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.should_stop and self.should_stop():
+            return None
+        async with self._get_semaphore():
+            if self.should_stop and self.should_stop():
+                return None
+            return await handler(job)
+
+    def spawn(self, handler, job, delay: float = 0) -> asyncio.Task:
+        """在当前run()中追加一个任务，run()会等待它完成后才返回；delay 为开始前的等待秒数（用于退避）"""
+        pending = _current_dispatch_run.get()
+        task = asyncio.ensure_future(self._run_job(handler, job, delay))
+        if pending is not None:
+            pending.add(task)
+        return task
+
+    async def run(self, jobs, handler) -> list:
+        """并发执行所有任务
+
+        Args:
+            jobs: 任务列表，或异步迭代器（任务陆续产出，产出一个就立即开始执行）
+            handler: 协程函数 handler(job)，返回该任务的结果
+
+        Returns:
+            与jobs一一对应的结果列表；处理函数抛出的异常作为对应位置的结果返回，
+            被停止请求跳过的任务结果为None
+        """
+        pending = set()
+        token = _current_dispatch_run.set(pending)
+        try:
+            if hasattr(jobs, "__aiter__"):
+                tasks = []
+                async for job in jobs:
+                    tasks.append(self.spawn(handler, job))
+            else:
+                tasks = [self.spawn(handler, job) for job in jobs]
+        finally:
+            _current_dispatch_run.reset(token)
+
+        # 等待全部任务（包括运行过程中通过spawn追加的任务）完成
+        while pending:
+            current = list(pending)
+            pending.difference_update(current)
+            await asyncio.gather(*current, return_exceptions=True)
+
+        results = []
+        for task in tasks:
+            if task.cancelled():
+                results.append(None)
+            elif task.exception() is not None:
+                results.append(task.exception())
+            else:
+                results.append(task.result())
+        return results
+
+
+class StreamStalledError(Exception):
+    """流式响应在规定时间内没有收到新数据（或连接中途断开）
+
+    partial_text 保存已经收到的内容，调用方可以保留其中已完整的行。
+    """
+
+    def __init__(self, message, partial_text=""):
+        super().__init__(message)
+        self.partial_text = partial_text
+
+
+class IncrementalBatchParser:
+    """流式批量响应的增量解析器
+
+    随着token到达不断调用feed()，每当一条 "[n] 译文" 完整到达（即出现下一个编号）时
+    立即通过 on_entry(n, text) 交出，最后一条在 finish() 时交出。
+    """
+
+    _MARKER = re.compile(r'\[\s*(\d+)\s*\]')
+    _MARKER_OVERLAP = 32  # 被拆分在两段之间的标记最多回看的字符数
+
+    def __init__(self, on_entry=None):
+        self.on_entry = on_entry
+        self.entries = {}  # 编号 -> 原始译文（未清理）
+        self._chunks = []  # 已经切分完的文本
+        self._tail = ""  # 当前未完成条目的内容（从上一个标记之后开始）
+        self._current = None  # 当前未完成条目的编号
+
+    def feed(self, delta: str):
+        """追加一段新到达的文本
+
+        只扫描新到达的文本和之前末尾的一小段（标记可能被拆分在两段之间），
+        已切分的文本不再重复扫描，整个响应的解析耗时与长度成线性关系。
+        """
+        if not delta:
+            return
+        search_from = max(0, len(self._tail) - self._MARKER_OVERLAP)
+        self._tail += delta
+        consumed = 0
+        for match in self._MARKER.finditer(self._tail, search_from):
+            self._close_current(self._tail[consumed:match.start()])
+            self._current = int(match.group(1))
+            consumed = match.end()
+        if consumed:
+            self._chunks.append(self._tail[:consumed])
+            self._tail = self._tail[consumed:]
+
+    def finish(self) -> dict:
+        """流结束，交出最后一条并返回全部条目"""
+        self._close_current(self._tail)
+        self._current = None
+        return self.entries
+
+    @property
+    def text(self) -> str:
+        """已收到的全部文本"""
+        return "".join(self._chunks) + self._tail
+
+    def _close_current(self, content: str):
+        if self._current is None:
+            return
+        content = content.strip()
+        number = self._current
+        self._current = None
+        if number in self.entries:
+            return
+        self.entries[number] = content
+        if self.on_entry:
+            self.on_entry(number, content)
+
+
+class TranslationMemory:
+    """持久化翻译记忆（SQLite）
+
+    以"规范化原文 + 源/目标语言 + 模型 + 提示词版本"为键保存译文。剧集字幕中大量重复的
+    台词（片头、回顾、口头禅等）命中后无需再次发送给API。超过容量时按最近使用时间淘汰。
+    """
+
+    PROMPT_VERSION = "batch-v2"  # 批量翻译提示词变化时更新，使旧译文失效
+    TABLE = "translations"  # 数据表名，子类使用各自的表，互不参与对方的淘汰
+    DEFAULT_PATH = "translation_memory.db"
+    _LOOKUP_CHUNK = 500  # 单条SQL中IN参数的数量上限
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 200000, namespace: str = ""):
+        """打开（必要时创建）翻译记忆数据库
+
+        Args:
+            path: 数据库文件路径
+            max_entries: 最多保存的条目数，超出时淘汰最久未使用的条目
+            namespace: 键的命名空间，见 make_namespace()
+        """
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max(1, int(max_entries or 1))
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_used ON {self.TABLE}(last_used)")
+        self.conn.commit()
+        # 条目数只在打开时统计一次，之后随写入和淘汰维护，避免每批都全表计数
+        self._count = self.conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config) -> Optional["TranslationMemory"]:
+        """根据翻译配置打开翻译记忆，未启用或打开失败时返回None"""
+        if not config.get("translation_memory", False):
+            return None
+        try:
+            return cls(config.get("translation_memory_path", "") or cls.DEFAULT_PATH,
+                       config.get("translation_memory_max_entries", 200000),
+                       cls.make_namespace(config))
+        except sqlite3.Error as e:
+            print(f"打开翻译记忆失败: {str(e)}")
+            return None
+
+    @classmethod
+    def make_namespace(cls, config) -> str:
+        """语言对、模型、提示词版本以及影响译文的术语表共同构成键的命名空间"""
+        terminology = json.dumps(config.get("custom_terminology") or {}, ensure_ascii=False, sort_keys=True)
+        return "\x1f".join([
+            cls.PROMPT_VERSION,
+            config.get("source_lang", ""),
+            config.get("target_lang", ""),
+            config.get("model", ""),
+            hashlib.sha1(terminology.encode("utf-8")).hexdigest()
+        ])
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化原文：去除首尾空白并合并连续空白"""
+        return " ".join(text.split())
+
+    def _key(self, text: str) -> str:
+        source = self.normalize(text)
+        return hashlib.sha1(f"{self.namespace}\x1f{source}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, str]:
+        """批量查询整份字幕的译文
+
+        Args:
+            texts: 原文列表（可以重复）
+
+        Returns:
+            {规范化原文: 译文}，只包含命中的条目
+        """
+        keys = {}
+        for source in {self.normalize(text) for text in texts}:
+            if source:
+                keys[self._key(source)] = source
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), self._LOOKUP_CHUNK):
+            chunk = key_list[start:start + self._LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, translation FROM {self.TABLE} WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, translation in rows:
+                found[keys[key]] = translation
+        if found:
+            # 更新命中条目的最近使用时间，供LRU淘汰使用
+            now = time.time()
+            self.conn.executemany(f"UPDATE {self.TABLE} SET last_used = ? WHERE key = ?",
+                                  [(now, self._key(source)) for source in found])
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, pairs: Dict[str, str]):
+        """保存一批 {原文: 译文}，空原文或空译文会被忽略"""
+        now = time.time()
+        rows = []
+        for text, translation in pairs.items():
+            source = self.normalize(text)
+            if source and translation and translation.strip():
+                rows.append((self._key(source), source, translation, now))
+        if not rows:
+            return
+        # 先插入新条目（rowcount 即新增条数），再覆盖已有条目的译文
+        inserted = self.conn.executemany(
+            f"INSERT OR IGNORE INTO {self.TABLE} (key, source, translation, last_used) VALUES (?, ?, ?, ?)", rows
+        ).rowcount
+        self.conn.executemany(
+            f"UPDATE {self.TABLE} SET source = ?, translation = ?, last_used = ? WHERE key = ?",
+            [(source, translation, used, key) for key, source, translation, used in rows]
+        )
+        self.conn.commit()
+        self._count += max(0, inserted)
+        self.evict()
+
+    def evict(self):
+        """条目数超过上限时，删除最久未使用的条目"""
+        if self._count <= self.max_entries:
+            return
+        deleted = self.conn.execute(
+            f"DELETE FROM {self.TABLE} WHERE key IN "
+            f"(SELECT key FROM {self.TABLE} ORDER BY last_used ASC LIMIT ?)",
+            (self._count - self.max_entries,)
+        ).rowcount
+        self.conn.commit()
+        self._count -= max(0, deleted)
+
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SegmentationCache(TranslationMemory):
+    """字幕分段结果缓存
+
+    与翻译记忆共用数据库文件，但使用单独的数据表和淘汰计数，翻译记忆的写入不会挤掉分段结果。
+    以分段请求的原始文本为键，不做空白规范化——换行正是分段要改写的内容。
+    """
+
+    PROMPT_VERSION = "segment-v1"  # 分段提示词变化时更新，使旧的分段结果失效
+    TABLE = "segments"
+
+    @classmethod
+    def from_config(cls, config) -> Optional["SegmentationCache"]:
+        """根据翻译配置打开分段缓存，未启用翻译记忆或打开失败时返回None"""
+        if not config.get("translation_memory", False):
+            return None
+        try:
+            return cls(config.get("translation_memory_path", "") or cls.DEFAULT_PATH,
+                       config.get("translation_memory_max_entries", 200000),
+                       "\x1f".join([cls.PROMPT_VERSION, config.get("model", "")]))
+        except sqlite3.Error as e:
+            print(f"打开分段缓存失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """分段缓存按原始文本匹配"""
+        return text
+
+
+class CheckpointJournal:
+    """追加写入的翻译断点日志（JSONL）
+
+    首行记录任务键，之后每完成一个批次追加一行 {"batch": 批次标签, "translations": {原文: 译文}}，
+    写入后立即 flush 并 fsync，一行就是一次原子提交：进程中途退出时最多丢失正在写入的那一行，
+    读取时会跳过不完整的行。任务键由输入内容和影响译文的配置计算，文件名也由它决定，
+    同一任务重新启动时能找到之前的日志，已经翻译过的字幕不再发送。任务完成后日志被删除。
+    只有启用 recovery_enabled 时才会创建日志。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, key: str, resume: bool = True):
+        """打开（必要时创建）断点日志
+
+        Args:
+            path: 日志文件路径
+            key: 任务键，已有日志的任务键不同时丢弃其内容重新开始
+            resume: 是否读取已有日志中的译文；为False时清空重新开始
+        """
+        self.path = path
+        self.key = key
+        self.entries = {}  # 规范化原文 -> 译文
+        self.resumed_batches = 0
+        if resume and os.path.exists(path):
+            self._load()
+        if self.entries:
+            # 截掉中途退出时写了一半的末行，之后追加的记录从新的一行开始
+            self._truncate_torn_tail()
+            self._file = open(path, "a", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+            self._append({"journal": self.VERSION, "key": key})
+
+    @classmethod
+    def make_key(cls, config, source: bytes) -> str:
+        """任务键：输入内容与语言对、模型、提示词版本、术语表的哈希"""
+        digest = hashlib.sha256(TranslationMemory.make_namespace(config).encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(source)
+        return digest.hexdigest()
+
+    @classmethod
+    def from_config(cls, config, input_file: str, output_file: str, subtitles=None) -> Optional["CheckpointJournal"]:
+        """为一个翻译任务打开断点日志，未启用 recovery_enabled 或无法创建时返回None
+
+        日志默认放在输出文件所在目录，文件名包含任务键；设置了 recovery_file 时使用该路径
+        （若是目录则放在该目录下）。已有同一任务的日志时从中续译。
+        """
+        if not config.get("recovery_enabled", False):
+            return None
+        try:
+            if input_file and os.path.exists(input_file):
+                with open(input_file, "rb") as f:
+                    source = f.read()
+            else:
+                source = "\n".join(sub["content"] for sub in subtitles or []).encode("utf-8")
+            key = cls.make_key(config, source)
+            name = f".checkpoint_{key[:16]}.jsonl"
+            recovery_file = config.get("recovery_file", "")
+            if not recovery_file:
+                path = os.path.join(os.path.dirname(output_file), name)
+            elif os.path.isdir(recovery_file):
+                path = os.path.join(recovery_file, name)
+            else:
+                path = recovery_file
+            return cls(path, key)
+        except OSError as e:
+            print(f"创建断点日志失败: {str(e)}")
+            return None
+
+    def _load(self):
+        """读取已有日志；任务键不符时忽略全部内容，不完整的行跳过"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return
+        if header.get("key") != self.key:
+            return
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.entries.update(record.get("translations", {}))
+            self.resumed_batches += 1
+
+    def _truncate_torn_tail(self):
+        """把文件截断到最后一个换行符处"""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def get(self, text: str) -> Optional[str]:
+        """查询已提交的译文"""
+        return self.entries.get(TranslationMemory.normalize(text))
+
+    def commit(self, label: str, pairs: Dict[str, str]):
+        """提交一个批次的 {原文: 译文}，空译文会被忽略"""
+        translations = {}
+        for text, translation in pairs.items():
+            source = TranslationMemory.normalize(text)
+            if source and translation and translation.strip():
+                translations[source] = translation
+        if not translations or self._file is None:
+            return
+        self.entries.update(translations)
+        self._append({"batch": label, "translations": translations})
+
+    def close(self):
+        """关闭日志文件，保留已提交的内容供下次续译"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        """任务已完成：关闭并删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# 中日韩字符（含全角标点），每个字符大约对应一个token
+_CJK_CHAR_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]')
+
+# 批量响应中的编号标记：[1] 可出现在任意位置；1. / Translation 1: / 翻译1: 只在行首识别
+_BRACKET_MARKER_PATTERN = re.compile(r'\[\s*(\d+)\s*\]')
+_LINE_MARKER_PATTERN = re.compile(r'^[ \t]*(?:(\d+)[\.。:：、]|Translation\s+(\d+)\s*:|翻译\s*(\d+)\s*[\.。:：、])', re.MULTILINE)
+
+# 译文清理用到的正则在导入时编译一次。clean_llm_response 的前缀规则需要按顺序逐条应用，
+# 先用它们合并成的一个正则检查开头，绝大多数译文一条都不匹配，可以直接跳过逐条替换
+_LLM_TIME_PREFIX_PATTERN = re.compile(r'^[\s\n]*根据时间轴和字幕长度要求[^，。\n]*[，。]?', re.DOTALL)
+_LLM_PREFIXES = (
+    r'^[\s\n]*最终翻译[\s\n]*',
+    r'^[\s\n]*翻译结果[:：][\s\n]*',
+    r'^[\s\n]*最终译文[:：][\s\n]*',
+    r'^[\s\n]*译文[:：][\s\n]*',
+    r'^[\s\n]*Translation:[\s\n]*',
+    r'^[\s\n]*最终字幕[\s\n]*',
+    r'^[\s\n]*Translated subtitle:[\s\n]*',
+    r'^[\s\n]*优化后的翻译[:：][\s\n]*',
+    r'^[\s\n]*修正后的翻译[:：][\s\n]*',
+    r'^[\s\n]*字幕翻译[:：][\s\n]*',
+    r'^[\s\n]*Final translation:[\s\n]*',
+    r'^[\s\n]*以下是(最终)?(的)?翻译(结果)?[:：]?[\s\n]*',
+    r'^[\s\n]*以下是(最终)?(的)?译文[:：]?[\s\n]*',
+    r'^[\s\n]*这是(最终)?(的)?翻译(结果)?[:：]?[\s\n]*',
+    r'^[\s\n]*这是(最终)?(的)?译文[:：]?[\s\n]*',
+    r'^[\s\n]*下面是(最终)?(的)?翻译(结果)?[:：]?[\s\n]*',
+    r'^[\s\n]*Here is the translation:[\s\n]*',
+    r'^[\s\n]*Here is the subtitle:[\s\n]*',
+    r'^[\s\n]*The optimized translation:[\s\n]*',
+    r'^[\s\n]*根据(您|你)(提供的)?(规则|要求).*?(我|以下是)?.*?翻译(结果)?[:：]?[\s\n]*',
+    r'^[\s\n]*(根据|按照|遵循).*?(要求|规则|标准).{0,50}(翻译|优化|调整)(结果)?[:：]?[\s\n]*',
+    r'^[\s\n]*(我已|我已经|我对|我将).{0,30}(翻译|优化|调整).{0,50}[:：]?[\s\n]*',
+    r'^[\s\n]*(以下|如下|下面)(是|为).{0,20}(翻译|结果|译文)([:：])?[\s\n]*',
+    r'^[\s\n]*(确保|保持).{0,30}(语义|字幕|翻译).{0,50}[:：]?[\s\n]*',
+)
+_LLM_PREFIX_PATTERNS = tuple(re.compile(p, re.IGNORECASE | re.DOTALL) for p in _LLM_PREFIXES)
+_LLM_ANY_PREFIX_PATTERN = re.compile('|'.join(f'(?:{p})' for p in _LLM_PREFIXES), re.IGNORECASE | re.DOTALL)
+_LLM_NOTE_PATTERNS = (re.compile(r'\(注:.*?\)'), re.compile(r'\[注:.*?\]'))
+_LLM_LEADING_SENTENCE_PATTERN = re.compile(r'^[\s\n]*根据[^。\n]+。')
+_WHITESPACE_RUN_PATTERN = re.compile(r'\s+')
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+# 单条译文中的前缀、引号和注释
+_CONTENT_PREFIX_PATTERN = re.compile(r'^(翻译|译文|Translation)\s*[:：]')
+_CONTENT_QUOTE_PATTERN = re.compile(r'^["""「『』」""\'\'\']+|["""「『』」""\'\'\']+$')
+_CONTENT_NOTE_PATTERN = re.compile(r'\(.*?\)|\[.*?\]', re.DOTALL)
+
+# 说明性文本/常见错误响应的特征，各自合并成一个正则，一次搜索即可判断
+_COMMON_ERROR_PATTERN = re.compile('|'.join(f'(?:{p})' for p in (
+    r'^[\s\n]*(根据要求|根据您的要求|遵循规则|遵循您的规则|按照规则)[，,\s\n]',
+    r'^[\s\n]*(我已|已经|现已)[对将把].*?(进行了|完成了|做了)[优校调修][整改善化]',
+    r'^[\s\n]*这(是|里是)[修优校调]正[后的]*译文',
+    r'^[\s\n]*Translation:',
+    r'^[\s\n]*以下是[优修校][化正对]后的[字翻译]幕',
+)), re.IGNORECASE)
+_EXPLANATION_PATTERN = re.compile('|'.join(f'(?:{p})' for p in (
+    r'^(根据|按照|参考).{0,25}(要求|规则|标准)',
+    r'^(这|以下|如下).{0,5}(是|为).{0,10}(翻译|结果)',
+    r'(保持|确保).{0,25}(完整|一致|准确)',
+    r'(为了|已经).{0,25}(优化|调整)',
+    r'(我已|我对|我将).{0,25}(翻译|优化)',
+    r'(字幕|翻译).{0,10}(质量|风格|特点)',
+)))
+_EXPLANATION_WORDS = ("翻译", "优化", "调整", "确保", "保持", "遵循", "规则",
+                      "要求", "风格", "质量", "长度", "适中", "流畅", "准确",
+                      "语义", "字幕", "完整", "分段")
+
+
+class HearingImpairedFilter:
+    """听障字幕（HI）标记清理器
+
+    删除 [脚步声]、(音乐)、*笑声* 等标记，以及单独成行的音效词。正则在创建时编译一次，
+    清理结果按原文缓存，同一段文本（重复出现的 [Music]、被多个阶段处理的字幕）只计算一次。
+    """
+
+    DEFAULT_TAGS = ("音乐", "音效", "笑声", "掌声", "叹息", "喘息", "脚步声", "门响", "电话铃", "引擎声",
+                    "Music", "Sound", "Laughter", "Applause", "Sighs", "Breathing", "Footsteps", "Door", "Phone", "Engine")
+    CACHE_SIZE = 100000  # 缓存条目上限，超过后清空重建
+
+    _DASH_BRACKET_LINE = re.compile(r'^\s*-\s*\[.*?\]', re.DOTALL)
+    _DASH_BRACKET = re.compile(r'\s*-\s*\[.*?\]', re.DOTALL)
+    _BRACKET = re.compile(r'\[.*?\]', re.DOTALL)
+    _PAREN = re.compile(r'\(.*?\)', re.DOTALL)
+    _STAR_HASH = re.compile(r'[*#].*?[*#]', re.DOTALL)
+    _LONE_DASH_LINE = re.compile(r'^\s*-\s*$', re.MULTILINE)
+
+    _instances = {}
+
+    def __init__(self, tags=None):
+        """
+        Args:
+            tags: 单独成行（或以破折号开头成行）时视为听障标记的词，默认为 DEFAULT_TAGS
+        """
+        self.tags = tuple(tags) if tags else self.DEFAULT_TAGS
+        alternation = "|".join(re.escape(tag) for tag in self.tags)
+        self._dash_tag_line = re.compile(rf'^\s*-\s*(?:{alternation})$', re.IGNORECASE | re.MULTILINE)
+        self._tag_only = re.compile(rf'^(?:{alternation})$', re.IGNORECASE)
+        self._max_tag_length = max(len(tag) for tag in self.tags)
+        self._cache = {}
+
+    @classmethod
+    def from_config(cls, config) -> "HearingImpairedFilter":
+        """根据配置获取清理器，hearing_impaired_tags 中的词（逗号分隔）追加到默认词表
+
+        相同词表共用一个实例，文件预处理和翻译线程共享缓存。
+        """
+        extra = tuple(tag.strip() for tag in re.split(r'[,，]', config.get("hearing_impaired_tags", "") or "") if tag.strip())
+        tags = cls.DEFAULT_TAGS + tuple(tag for tag in extra if tag not in cls.DEFAULT_TAGS)
+        instance = cls._instances.get(tags)
+        if instance is None:
+            instance = cls._instances[tags] = cls(tags)
+        return instance
+
+    def clean(self, text: str) -> str:
+        """返回删除听障标记后的文本（带缓存）"""
+        cleaned = self._cache.get(text)
+        if cleaned is None:
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            cleaned = self._cache[text] = self._clean(text)
+        return cleaned
+
+    def clean_many(self, texts: List[str]) -> List[str]:
+        """批量清理整个文件的字幕文本"""
+        return [self.clean(text) for text in texts]
+
+    def _clean(self, text: str) -> str:
+        if not text or not text.strip():
+            return ""
+        
+        # 处理带有破折号前缀的听障字幕，如 "- [light steps]"
+        if '-' in text and self._DASH_BRACKET_LINE.match(text):
+            # 检查是否整行都是类似格式 (可能有多行，每行都是破折号+方括号格式)
+            lines = text.split('\n')
+            if all(self._DASH_BRACKET_LINE.match(line.strip()) for line in lines if line.strip()):
+                return ""  # 如果整个字幕都是破折号+听障内容，直接返回空
+        
+        # 各规则按原有顺序应用，不含相应标记字符的规则直接跳过
+        cleaned_text = text
+        if '[' in cleaned_text:
+            # 先清理带有破折号前缀的听障标记，再清理所有方括号内的内容
+            cleaned_text = self._DASH_BRACKET.sub('', cleaned_text)
+            cleaned_text = self._BRACKET.sub('', cleaned_text)
+        
+        # 也处理常见的听障标记格式，如 (音乐) (鼓掌)
+        if '(' in cleaned_text:
+            cleaned_text = self._PAREN.sub('', cleaned_text)
+        
+        # 处理其他常见格式，如 *笑声* 或 #音乐#
+        if '*' in cleaned_text or '#' in cleaned_text:
+            cleaned_text = self._STAR_HASH.sub('', cleaned_text)
+        
+        # 处理带有破折号前缀的听障词汇，如 "- Music" or "- 音乐"
+        if '-' in cleaned_text:
+            cleaned_text = self._dash_tag_line.sub('', cleaned_text)
+        
+        # 处理常见的听障词汇，如果它们单独存在于一行（只有长度不超过最长标记词的文本才可能匹配）
+        if len(cleaned_text) <= self._max_tag_length + 1:
+            cleaned_text = self._tag_only.sub('', cleaned_text)
+        
+        # 清理前后空白
+        cleaned_text = cleaned_text.strip()
+        
+        if '-' in cleaned_text:
+            # 移除可能留下的孤立破折号 (如果一行只剩下破折号)
+            cleaned_text = self._LONE_DASH_LINE.sub('', cleaned_text)
+            
+            # 处理只剩下多个破折号的情况
+            if '-' in cleaned_text and not cleaned_text.replace('-', '').strip():
+                return ""
+        
+        # 如果清理后文本为空，说明整个字幕都是听障内容，应该被完全移除
+        return cleaned_text
+
+
+class QualityEstimator:
+    """本地译文质量估计器
+
+    不调用模型，对整个文件的（原文, 译文）一次性计算各项特征，再合成每条字幕的风险分（0-1）：
+    长度比偏离全文中位数、译文中残留源语言文字的比例、原样保留的源语言单词、
+    说明性文字、术语表违例，以及服务商提供的 logprob（可选）。
+    首字母大写或全大写的拉丁单词（人名、缩写）、数字和术语表中的译文术语
+    允许保留在译文中，不计入残留。
+    只有风险分达到阈值的字幕才送去最终审校；错误校正每条字幕单独请求，
+    还要求字幕明确失败或至少有 CORRECTION_MIN_SIGNALS 项特征异常。
+    残留文字与残留单词同时异常的半翻译译文视为明确失败，同样送去错误校正。
+    """
+
+    # 各项特征的权重，按 noisy-OR 合成：risk = 1 - Π(1 - 权重 × 特征值)
+    WEIGHTS = {
+        "length": 0.6,
+        "script": 0.9,
+        "leftover": 0.6,
+        "glossary": 0.7,
+        "logprob": 0.6,
+    }
+    SIGNAL_LEVEL = 0.5  # 特征值达到该值时记为一项异常
+    # 相互独立的异常项：残留文字与残留单词衡量的是同一件事，只算一项
+    SIGNAL_GROUPS = (("length",), ("script", "leftover"), ("glossary",), ("logprob",))
+    CORRECTION_MIN_SIGNALS = 2  # 送去错误校正所需的最少异常项数（明确失败的字幕除外）
+    MIN_SOURCE_CHARS = 4  # 原文少于该字符数时不计算长度比
+    LENGTH_TOLERANCE = 2.0  # 长度比在全文中位数的 1/2 到 2 倍之间不计风险
+    LOGPROB_TOLERANCE = -0.5  # 平均 logprob 高于该值不计风险
+
+    _LETTER = re.compile(r'[^\W\d_]')
+    _WORD = re.compile(r'[A-Za-z][a-z]{3,}')
+    _LATIN_TOKEN = re.compile(r"[A-Za-z][A-Za-z'-]*")
+    _EXEMPT_TOKEN = re.compile(r"(?<![A-Za-z])[A-Z][A-Za-z'-]*")  # 首字母大写或全大写的单词：人名、地名、缩写
+
+    def __init__(self, glossary: Optional[Dict[str, str]] = None, threshold: float = 0.5):
+        """
+        Args:
+            glossary: 术语表 {原文术语: 译文术语}
+            threshold: 风险阈值，风险分不低于该值的字幕被选中；0表示不按风险分过滤
+        """
+        self.glossary = [(source.lower(), target) for source, target in (glossary or {}).items() if source and target]
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config, glossary: Optional[Dict[str, str]] = None) -> "QualityEstimator":
+        """根据配置创建估计器，glossary 为空时使用配置中的自定义术语"""
+        return cls(glossary or config.get("custom_terminology") or {}, config.get("quality_threshold", 0.5))
+
+    @classmethod
+    def cjk_share(cls, text: str) -> float:
+        """文本的字母类字符中中日韩文字所占的比例"""
+        letters = cls._LETTER.findall(text)
+        if not letters:
+            return 0.0
+        return sum(1 for char in letters if _CJK_CHAR_PATTERN.match(char)) / len(letters)
+
+    @staticmethod
+    def hard_failure(translation: str) -> bool:
+        """空译文、未翻译标记和以#开头的行直接视为有问题"""
+        stripped = translation.strip()
+        return not stripped or "未翻译" in stripped or stripped.startswith("#")
+
+    def strip_exempt(self, translation: str) -> str:
+        """去掉允许保留在译文中的内容：术语表中的译文术语，以及首字母大写或全大写的单词"""
+        for _, target in self.glossary:
+            translation = translation.replace(target, " ")
+        return self._EXEMPT_TOKEN.sub(" ", translation)
+
+    def features(self, sources: List[str], translations: List[str],
+                 logprobs: Optional[List[Optional[float]]] = None) -> Dict[str, List[float]]:
+        """按列计算全部字幕的特征值（0-1），返回 {特征名: 每条字幕的值}"""
+        count = len(sources)
+        checked = [self.strip_exempt(text) for text in translations]
+        source_cjk = [self.cjk_share(text) for text in sources]
+        target_letters = [bool(self._LETTER.search(text)) for text in checked]
+        target_cjk = [self.cjk_share(text) for text in checked]
+        # 原文与译文的主要文字不同时（如英译中），译文中残留的源语言文字才是异常
+        source_is_cjk = self.median(source_cjk) > 0.5
+        cross_script = source_is_cjk != (self.median([share for share, has_letters in zip(target_cjk, target_letters)
+                                                      if has_letters]) > 0.5)
+
+        source_lengths = [len(text.replace(" ", "")) for text in sources]
+        target_lengths = [len(text.replace(" ", "")) for text in translations]
+        ratios = [target / source if source >= self.MIN_SOURCE_CHARS and target else 0.0
+                  for source, target in zip(source_lengths, target_lengths)]
+        median_ratio = self.median([ratio for ratio in ratios if ratio > 0])
+        tolerance = math.log(self.LENGTH_TOLERANCE)
+
+        columns = {name: [0.0] * count for name in self.WEIGHTS}
+        for i in range(count):
+            source = sources[i]
+            if ratios[i] > 0 and median_ratio > 0:
+                deviation = abs(math.log(ratios[i] / median_ratio))
+                columns["length"][i] = min(1.0, max(0.0, deviation - tolerance) / (2 * tolerance))
+            if cross_script and target_letters[i]:
+                columns["script"][i] = target_cjk[i] if source_is_cjk else 1.0 - target_cjk[i]
+            # 原文中的小写单词（排除人名等专有名词）作为完整单词原样出现在译文中
+            words = {word for word in self._WORD.findall(source) if word.islower()}
+            if words:
+                tokens = set(self._LATIN_TOKEN.findall(checked[i]))
+                columns["leftover"][i] = len(words & tokens) / len(words)
+            if self.glossary:
+                lowered_source = source.lower()
+                expected = [target for term, target in self.glossary if term in lowered_source]
+                if expected:
+                    columns["glossary"][i] = sum(1 for target in expected if target not in translations[i]) / len(expected)
+            if logprobs and i < len(logprobs) and logprobs[i] is not None:
+                columns["logprob"][i] = min(1.0, max(0.0, self.LOGPROB_TOLERANCE - logprobs[i]) / 2.0)
+        return columns
+
+    def assess(self, sources: List[str], translations: List[str],
+               logprobs: Optional[List[Optional[float]]] = None) -> Tuple[List[float], List[bool], List[int]]:
+        """计算每条字幕的风险分、是否明确失败以及相互独立的异常项数
+
+        空译文、未翻译标记、与原文相同的译文、说明性文字、"翻译：" 等前缀标签，以及残留文字与
+        残留单词都达到 SIGNAL_LEVEL 的半翻译译文视为明确失败，风险分记为1。
+        """
+        translations = [text if isinstance(text, str) else "" for text in translations]
+        columns = self.features(sources, translations, logprobs)
+        risks, failures, signals = [], [], []
+        for i, translation in enumerate(translations):
+            failed = (self.hard_failure(translation) or bool(_EXPLANATION_PATTERN.search(translation))
+                      or bool(_CONTENT_PREFIX_PATTERN.match(translation.strip()))
+                      or TranslationMemory.normalize(translation).lower() == TranslationMemory.normalize(sources[i]).lower()
+                      or (columns["script"][i] >= self.SIGNAL_LEVEL and columns["leftover"][i] >= self.SIGNAL_LEVEL))
+            keep = 1.0
+            for name, weight in self.WEIGHTS.items():
+                keep *= 1.0 - weight * columns[name][i]
+            risks.append(1.0 if failed else 1.0 - keep)
+            failures.append(failed)
+            signals.append(sum(1 for group in self.SIGNAL_GROUPS
+                               if any(columns[name][i] >= self.SIGNAL_LEVEL for name in group)))
+        return risks, failures, signals
+
+    def score(self, sources: List[str], translations: List[str],
+              logprobs: Optional[List[Optional[float]]] = None) -> List[float]:
+        """计算每条字幕的风险分（0-1）"""
+        return self.assess(sources, translations, logprobs)[0]
+
+    def select(self, sources: List[str], translations: List[str], positions: Optional[List[int]] = None,
+               logprobs: Optional[List[Optional[float]]] = None, min_signals: int = 0) -> List[int]:
+        """返回风险分达到阈值的字幕位置
+
+        Args:
+            positions: 限定候选范围（默认全部），特征统计仍基于整个文件
+            min_signals: 未明确失败的字幕还需至少有这么多项特征异常才被选中
+        """
+        if positions is None:
+            positions = range(len(translations))
+        if self.threshold <= 0 and not min_signals:
+            return list(positions)
+        risks, failures, signals = self.assess(sources, translations, logprobs)
+        return [pos for pos in positions
+                if risks[pos] >= self.threshold and (failures[pos] or signals[pos] >= min_signals)]
+
+    @staticmethod
+    def median(values: List[float]) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        middle = len(ordered) // 2
+        return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class LineBreaker:
+    """本地最优断行引擎
+
+    不调用API，用动态规划在所有可断点中选出总代价最小的断行方案：每行的代价为
+    行宽与行长上限之差的平方（使各行长度均衡），每个断点再加上罚分——拆开连续的
+    首字母大写单词（人名、地名）、行尾悬挂冠词/介词/连词、在汉字之间或中日韩文字与
+    拉丁文字交界处断开都会加罚，在从句结束的标点后断开则有奖励。
+    超出 max_lines 或行长上限时按罚分处理而不是报错，总能给出结果。
+    """
+
+    CJK_LINE_LENGTH = 16  # 中日韩文字每行字符数（Netflix 规范）
+    LATIN_LINE_LENGTH = 42  # 其他文字每行字符数（Netflix 规范）
+
+    # 罚分与行长不均衡代价处于同一量级：空出一整行的代价为100
+    RAGGEDNESS_WEIGHT = 100.0
+    BREAK_PENALTY = 20.0  # 在没有标点处断行的基础罚分
+    CJK_BREAK_PENALTY = 25.0  # 在两个汉字之间断行（可能拆开词语）
+    SCRIPT_BOUNDARY_PENALTY = 40.0  # 在中日韩文字与拉丁文字交界处断行
+    DANGLING_PENALTY = 50.0  # 行尾为冠词、介词、连词
+    PROPER_NOUN_PENALTY = 200.0  # 拆开连续的首字母大写单词
+    CLAUSE_BONUS = -30.0  # 在从句结束的标点后断行
+    OVERFLOW_PENALTY = 20.0  # 超出行长上限的罚分系数，按超出字符数的平方计算：超出一个字符可以换来在从句标点后断行，超出更多则迅速变贵
+    EXTRA_LINE_PENALTY = 1000.0  # 每超出 max_lines 一行
+
+    CLAUSE_END = "，,、；;：:。.!?！？…—"
+    ATTACHED_PUNCTUATION = "，,、；;：:。.!?！？…—」』）》〉】)]}\"'”’%"  # 附着在前一个单元末尾
+    OPENING_PUNCTUATION = "「『（《〈【([{“‘"  # 与后一个字符连在一起
+    DANGLING_WORDS = frozenset((
+        "a", "an", "the", "of", "to", "in", "on", "at", "for", "and", "or", "but", "nor",
+        "with", "from", "by", "as", "that", "my", "your", "his", "her", "our", "their",
+        "le", "la", "les", "un", "une", "de", "des", "du", "et", "el", "los", "las", "y", "der", "die", "das", "und",
+    ))
+    _TAG = re.compile(r'<[^>]+>|\{\\[^}]*\}')
+
+    def __init__(self, max_line_length: int = 0, max_lines: int = 2):
+        """
+        Args:
+            max_line_length: 每行最多字符数，0表示按文字自动选择（中日韩16，其他42）
+            max_lines: 每条字幕最多行数
+        """
+        self.max_line_length = max(0, int(max_line_length or 0))
+        self.max_lines = max(1, int(max_lines or 1))
+
+    @classmethod
+    def from_config(cls, config) -> "LineBreaker":
+        """根据翻译配置创建断行引擎"""
+        return cls(config.get("max_line_length", 0), config.get("max_lines", 2))
+
+    def line_length_for(self, text: str) -> int:
+        """行长上限：未指定时按文本的主要文字选择"""
+        if self.max_line_length:
+            return self.max_line_length
+        return self.CJK_LINE_LENGTH if QualityEstimator.cjk_share(text) > 0.5 else self.LATIN_LINE_LENGTH
+
+    def tokenize(self, text: str) -> Tuple[List[str], List[bool]]:
+        """把文本切分为不可再分的单元：拉丁文字按单词，中日韩文字按字，标点附着在前一个单元上
+
+        Returns:
+            (单元列表, 每个单元前是否有空格)
+        """
+        atoms = []
+        spaced = []
+        space = False
+        previous_cjk = False
+        glue = False
+        for char in text:
+            if char.isspace():
+                space = True
+                glue = False
+                continue
+            attached = char in self.ATTACHED_PUNCTUATION
+            cjk = not attached and bool(_CJK_CHAR_PATTERN.match(char))
+            if atoms and not space and (glue or attached or not (cjk or previous_cjk)):
+                atoms[-1] += char
+            else:
+                spaced.append(space and bool(atoms))
+                atoms.append(char)
+            glue = char in self.OPENING_PUNCTUATION
+            if not attached:
+                previous_cjk = cjk
+            space = False
+        return atoms, spaced
+
+    def break_penalty(self, previous: str, following: str) -> float:
+        """在 previous 与 following 两个单元之间断行的罚分"""
+        if previous[-1] in self.CLAUSE_END:
+            return self.CLAUSE_BONUS
+        previous_cjk = bool(_CJK_CHAR_PATTERN.match((previous.rstrip(self.ATTACHED_PUNCTUATION) or previous)[-1]))
+        following_cjk = bool(_CJK_CHAR_PATTERN.match(following[0]))
+        if previous_cjk and following_cjk:
+            return self.CJK_BREAK_PENALTY
+        penalty = self.BREAK_PENALTY
+        if previous_cjk != following_cjk:
+            penalty += self.SCRIPT_BOUNDARY_PENALTY
+        word = self._TAG.sub("", previous).strip(self.OPENING_PUNCTUATION + self.ATTACHED_PUNCTUATION).lower()
+        if word in self.DANGLING_WORDS:
+            penalty += self.DANGLING_PENALTY
+        if previous[:1].isupper() and following[:1].isupper():
+            penalty += self.PROPER_NOUN_PENALTY
+        return penalty
+
+    def break_text(self, text: str) -> str:
+        """重新断行，不超过行长上限的文本合并为一行"""
+        if not text or not text.strip():
+            return text
+        # 去掉原有换行：两侧都是中日韩文字时直接相连，否则以空格连接
+        lines = [line.strip() for line in text.split("\n") if line.strip()]
+        joined = lines[0]
+        for line in lines[1:]:
+            both_cjk = _CJK_CHAR_PATTERN.match(joined[-1]) and _CJK_CHAR_PATTERN.match(line[0])
+            joined += line if both_cjk else " " + line
+        limit = self.line_length_for(joined)
+
+        atoms, spaced = self.tokenize(joined)
+        widths = [len(self._TAG.sub("", atom)) for atom in atoms]
+        count = len(atoms)
+        # starts[k]：第k个单元在整行中的起始列（含前面的空格），行宽 = 末单元结束列 - 首单元起始列
+        starts = []
+        column = 0
+        for k in range(count):
+            if k and spaced[k]:
+                column += 1
+            starts.append(column)
+            column += widths[k]
+        if column <= limit:
+            return joined
+
+        penalties = [0.0] + [self.break_penalty(atoms[k - 1], atoms[k]) for k in range(1, count)]
+        # 行数上限留出余量，保证超长文本也有可行解
+        max_lines = min(count, max(self.max_lines + 2, column // limit + 2))
+        infinity = float("inf")
+        # best[l][j]：前j个单元排成l行的最小代价
+        best = [[infinity] * (count + 1) for _ in range(max_lines + 1)]
+        choice = [[0] * (count + 1) for _ in range(max_lines + 1)]
+        best[0][0] = 0.0
+        for line_count in range(1, max_lines + 1):
+            for end in range(line_count, count + 1):
+                line_end = starts[end - 1] + widths[end - 1]
+                for begin in range(end - 1, line_count - 2, -1):
+                    if best[line_count - 1][begin] == infinity:
+                        continue
+                    width = line_end - starts[begin]
+                    if width > 2 * limit and begin < end - 1:
+                        break  # 再往前延伸只会更宽
+                    slack = (limit - width) / limit
+                    cost = best[line_count - 1][begin] + self.RAGGEDNESS_WEIGHT * slack * slack
+                    if width > limit:
+                        cost += self.OVERFLOW_PENALTY * (width - limit) ** 2
+                    if begin:
+                        cost += penalties[begin]
+                    if cost < best[line_count][end]:
+                        best[line_count][end] = cost
+                        choice[line_count][end] = begin
+
+        line_count = min(range(1, max_lines + 1),
+                         key=lambda n: best[n][count] + self.EXTRA_LINE_PENALTY * max(0, n - self.max_lines))
+        if best[line_count][count] == infinity:
+            return joined
+        breaks = []
+        end = count
+        for n in range(line_count, 0, -1):
+            begin = choice[n][end]
+            breaks.append((begin, end))
+            end = begin
+        return "\n".join(
+            "".join((" " if k > begin and spaced[k] else "") + atoms[k] for k in range(begin, end))
+            for begin, end in reversed(breaks)
+        )
+
+    def break_subtitles(self, subtitles: List[dict]) -> List[dict]:
+        """对每条字幕重新断行，返回新的字幕列表"""
+        results = []
+        for sub in subtitles:
+            broken = sub.copy()
+            broken['content'] = self.break_text(sub['content'])
+            results.append(broken)
+        return results
+
+
+class SubtitleProcessor:
+    DEFAULT_OUTPUT_TOKENS = 4096  # 未设置max_tokens时假定的单次输出上限
+    PROMPT_OVERHEAD_TOKENS = 1000  # 系统提示词等固定开销
+    LINE_OVERHEAD_TOKENS = 4  # 每条字幕的编号、换行等格式开销
+    OUTPUT_SAFETY_RATIO = 0.8  # 输出预算只用到80%，为估算误差留余量
+
+    @staticmethod
+    def tokenize_batch_response(response: str, stop_at_blank_line: bool = False) -> List[Tuple[int, str]]:
+        """线性扫描批量响应，按编号切分为 [(编号, 内容)]
+
+        编号格式按优先级依次为 [1]、1.、Translation 1:、翻译1:，响应中出现优先级最高的格式后，
+        只用该格式切分，其他格式的行视为内容的一部分。第一个编号之前的说明性文字被忽略。
+        只用不含回溯的正则定位编号标记（最多扫描两遍），内容按标记位置直接切片，
+        解析耗时与响应长度成线性关系。
+
+        Args:
+            response: 模型返回的文本
+            stop_at_blank_line: 为True时每条内容在第一个空行处结束（响应后面还附带术语表等内容时使用）
+        """
+        markers = [(m.start(), m.end(), int(m.group(1))) for m in _BRACKET_MARKER_PATTERN.finditer(response)]
+        if not markers:
+            # 没有 [n] 标记时查找行首编号，按格式分别收集
+            found = ([], [], [])
+            for match in _LINE_MARKER_PATTERN.finditer(response):
+                found[match.lastindex - 1].append((match.start(), match.end(), int(match.group(match.lastindex))))
+            markers = next((group for group in found if group), [])
+        
+        records = []
+        for k, (_, end, number) in enumerate(markers):
+            stop = markers[k + 1][0] if k + 1 < len(markers) else len(response)
+            if stop_at_blank_line:
+                blank = response.find('\n\n', end, stop)
+                if blank >= 0:
+                    stop = blank
+            records.append((number, response[end:stop].strip()))
+        return records
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """估算文本的token数
+
+        中日韩字符按每字1个token计算，其他字符（拉丁字母、数字、空格等）按每4个字符1个token计算。
+        """
+        if not text:
+            return 0
+        cjk_count = len(_CJK_CHAR_PATTERN.findall(text))
+        return cjk_count + (len(text) - cjk_count + 3) // 4
+
+    @staticmethod
+    def token_budgets(config) -> Tuple[int, int]:
+        """根据模型上下文窗口和max_tokens计算单次请求的输入/输出token预算
+
+        Returns:
+            (输入预算, 输出预算)
+        """
+        output_budget = int(config.get("max_tokens") or SubtitleProcessor.DEFAULT_OUTPUT_TOKENS)
+        context_window = int(config.get("context_window") or 0)
+        if context_window:
+            input_budget = context_window - output_budget - SubtitleProcessor.PROMPT_OVERHEAD_TOKENS
+        else:
+            input_budget = output_budget
+        return max(256, input_budget), max(256, int(output_budget * SubtitleProcessor.OUTPUT_SAFETY_RATIO))
+
+    @staticmethod
+    def pack_batches(texts: List[str], config, max_items: int = None, output_ratio: float = 1.5,
+                     extra_output_tokens: int = 0) -> List[List[int]]:
+        """按token预算把字幕打包成批次
+
+        依次把字幕放入当前批次，直到再加一条就会超出输入预算、输出预算或条数上限，
+        每个批次至少包含一条字幕。批次内的序号保持原有顺序并且连续。
+
+        Args:
+            texts: 待翻译的文本列表
+            config: 翻译配置，用于计算token预算
+            max_items: 每批最多条数，默认取 config.batch_size
+            output_ratio: 预计输出token与输入token的比例
+            extra_output_tokens: 每条字幕在输出中的额外固定开销（如时间轴、原文等）
+
+        Returns:
+            批次列表，每个批次为texts中的序号列表
+        """
+        input_budget, output_budget = SubtitleProcessor.token_budgets(config)
+        max_items = max(1, int(max_items or config.get("batch_size", 40) or 40))
+        
+        batches = []
+        current = []
+        input_used = output_used = 0
+        for idx, text in enumerate(texts):
+            input_cost = SubtitleProcessor.estimate_tokens(text) + SubtitleProcessor.LINE_OVERHEAD_TOKENS
+            output_cost = int(input_cost * output_ratio) + extra_output_tokens
+            if current and (len(current) >= max_items
+                            or input_used + input_cost > input_budget
+                            or output_used + output_cost > output_budget):
+                batches.append(current)
+                current = []
+                input_used = output_used = 0
+            current.append(idx)
+            input_used += input_cost
+            output_used += output_cost
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def remove_hearing_impaired(text: str) -> str:
+        """删除听障字幕（方括号内的内容），使用默认词表和共享缓存"""
+        return HearingImpairedFilter.from_config({}).clean(text)
+
+    @staticmethod
+    def clean_punctuation(text: str) -> str:
+        """将标点符号替换为空格"""
+        # 定义所有需要替换的标点符号
+        punctuation_pattern = r'[，。！？：；,.!?:;，。！？：；""《》〈〉：！；，。、？\-\[\]【】()]'
+        cleaned_text = re.sub(punctuation_pattern, ' ', text)
+        # 将多个空格合并为一个空格
+        cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
+        return cleaned_text.strip()
+
+    @staticmethod
+    def split_into_sentences(text: str) -> List[str]:
+        """将文本分割成句子"""
+        # 使用标点符号作为分隔符
+        sentences = re.split(r'(?<=[.!?。！？])\s*', text)
+        return [s.strip() for s in sentences if s.strip()]
+        
+    @staticmethod
+    async def optimize_subtitle_segmentation(subtitles: List[dict], config: TranslationConfig,
+                                             api_client=None, dispatcher: Optional[BatchDispatcher] = None) -> List[dict]:
+        """使用AI优化字幕分段，达到Netflix级别的字幕质量
+        
+        1. 分析完整字幕内容和时间轴
+        2. 重新分割字幕，确保每行长短适中，在完整停顿处断句
+        3. 确保专有名词不被分开
+        4. 保持时间轴对齐
+
+        segmentation_mode 为 "local" 时改用本地断行引擎 LineBreaker，不发送任何请求。
+        字幕按token预算分段，各段通过调度器并发发送；某一段请求失败或条数对不上时只有该段保留原始分段。
+        启用翻译记忆时，各段结果按内容缓存，重新运行时只发送内容有变化的段。
+        api_client 为任务共享的APIClient；未提供时临时创建一个并在结束时关闭。
+        dispatcher 为任务共享的调度器；未提供时按 config.concurrency 新建。
+        """
+        if not subtitles or not config.netflix_style:
+            return subtitles  # 如果未启用或无字幕，直接返回原始字幕
+        if config.get("segmentation_mode", "llm") == "local":
+            return LineBreaker.from_config(config).break_subtitles(subtitles)  # 本地断行，不调用API
+            
+        own_client = api_client is None
+        if own_client:
+            api_client = APIClient.from_config(config)
+        cache = SegmentationCache.from_config(config)
+        try:
+            # 为了限制API请求量，每次处理最多100条字幕，同时不超过token预算
+            MAX_SUBS_PER_REQUEST = 100
+            segment_batches = SubtitleProcessor.pack_batches(
+                [sub['content'] for sub in subtitles], config, MAX_SUBS_PER_REQUEST,
+                output_ratio=1.2, extra_output_tokens=SubtitleProcessor.estimate_tokens("[0000] 00:00:00,000 --> 00:00:00,000\n")
+            )
+            chunks = [subtitles[group[0]:group[-1] + 1] for group in segment_batches]
+            # 每段的请求内容，同时作为缓存的键
+            chunk_texts = [
+                "\n\n".join(f"[{sub['index']}] {sub['time_info']}\n{sub['content']}" for sub in chunk)
+                for chunk in chunks
+            ]
+            results = [None] * len(chunks)
+            
+            # 先从缓存中取出内容未变化的段
+            cached = cache.get_many(chunk_texts) if cache else {}
+            for n, chunk in enumerate(chunks):
+                contents = cached.get(chunk_texts[n])
+                if contents:
+                    contents = json.loads(contents)
+                    if len(contents) == len(chunk):
+                        results[n] = [sub.copy() for sub in chunk]
+                        for sub, content in zip(results[n], contents):
+                            sub['content'] = content
+            
+            # 构建系统提示词
+            system_prompt = f"""You are a professional subtitle editor specializing in Netflix-quality subtitle segmentation.
+Your task is to optimize subtitle segmentation based on these guidelines:
+1. Each subtitle line should be of moderate length (max ~60 chars for Western languages)
+2. Break at natural pause points (end of clauses, punctuation)
+3. Keep proper nouns and phrases together - never split names, places, or technical terms
+4. Maintain existing timecodes exactly as they are
+5. Return the EXACT SAME content just with improved line breaks 
+6. IMPORTANT: Never merge or split subtitles - keep exactly one output subtitle for each input
+
+For each subtitle, analyze its content and improve its segmentation by adding appropriate line breaks.
+Return the subtitles in the same exact format and order, with the same numbering.
+"""
+            
+            async def optimize_chunk(n):
+                chunk = chunks[n]
+                messages = [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": f"Please optimize the segmentation of these subtitles:\n\n{chunk_texts[n]}"}
+                ]
+                try:
+                    result = await api_client.chat_completion(
+                        messages,
+                        temperature=0.3,  # 低温度以确保结果稳定
+                        timeout=120  # 两分钟超时
+                    )
+                    optimized_chunk = SubtitleProcessor._parse_optimized_subtitles(result["choices"][0]["message"]["content"], chunk)
+                except Exception as e:
+                    # 请求失败只影响这一段，保留该段的原始字幕
+                    print(f"字幕分段优化第 {n + 1}/{len(chunks)} 段出错，保留原始分段: {str(e)}")
+                    return
+                # 验证优化后的字幕数量是否与该段原始字幕数量匹配，且没有内容被清空
+                if len(optimized_chunk) != len(chunk) or not all(sub['content'].strip() for sub in optimized_chunk):
+                    print(f"字幕分段优化第 {n + 1}/{len(chunks)} 段条数不匹配或内容为空，保留原始分段")
+                    return
+                results[n] = optimized_chunk
+                if cache:
+                    cache.put_many({chunk_texts[n]: json.dumps([sub['content'] for sub in optimized_chunk], ensure_ascii=False)})
+            
+            pending = [n for n, result in enumerate(results) if result is None]
+            if pending:
+                print(f"优化字幕分段时使用API主机: {api_client.api_base}，发送 {len(pending)}/{len(chunks)} 段")
+                await (dispatcher or BatchDispatcher(config.concurrency)).run(pending, optimize_chunk)
+            
+            optimized_subtitles = []
+            for chunk, result in zip(chunks, results):
+                optimized_subtitles.extend(result or chunk)
+            return optimized_subtitles
+        except Exception as e:
+            # 分段之外的错误（如缓存读取失败），返回原始字幕
+            print(f"字幕分段优化出错: {str(e)}")
+            return subtitles
+        finally:
+            if cache:
+                cache.close()
+            if own_client:
+                await api_client.close()
+
+    @staticmethod
+    async def multi_phase_translate(subtitles: List[dict], config: TranslationConfig, signals=None,
+                                    api_client=None, dispatcher=None) -> tuple:
+        """多阶段翻译: 先批量翻译，再提取术语、优化格式和时间轴
+        
+        1. 阶段一: 初步翻译和术语提取
+        2. 阶段二: 术语统一化和翻译反思  
+        3. 阶段三: 最终翻译、分段优化和时间轴调整
+        
+        Args:
+            subtitles: 字幕列表
+            config: 翻译配置
+            signals: 信号对象，用于发送进度信息
+            api_client: 任务共享的APIClient；未提供时临时创建一个并在结束时关闭
+            dispatcher: 任务共享的批次调度器；未提供时按 config.concurrency 创建一个
+            
+        Returns:
+            (翻译结果列表, 术语字典)
+        """
+        own_client = api_client is None
+        if own_client:
+            api_client = APIClient.from_config(config)
+        try:
+            return await SubtitleProcessor._multi_phase_translate(subtitles, config, signals, api_client,
+                                                                  dispatcher)
+        finally:
+            if own_client:
+                await api_client.close()
+
+    @staticmethod
+    async def _multi_phase_translate(subtitles: List[dict], config: TranslationConfig, signals,
+                                     api_client, dispatcher=None) -> tuple:
+        """multi_phase_translate 的实现部分，所有请求通过传入的 api_client 发送"""
+        if not subtitles:
+            if signals:
+                signals.progress.emit("没有找到有效的字幕")
+            return [], {}
+        
+        # 过滤空内容的字幕
+        cleaned_subtitles = [sub for sub in subtitles if sub["content"].strip()]
+        if not cleaned_subtitles:
+            if signals:
+                signals.progress.emit("没有找到有效的字幕内容进行翻译")
+            return [], {}
+        
+        if signals:
+            signals.progress.emit(f"开始多阶段翻译流程，共有 {len(cleaned_subtitles)} 条字幕")
+            signals.progress.emit("阶段1/3: 初步翻译和术语提取...")
+        
+        # 阶段1: 初步翻译和术语提取
+        terminology_dict = {}
+        # 按字幕位置寻址的结果存储，乱序完成的批次也能写回正确位置
+        first_pass_translations = [""] * len(cleaned_subtitles)
+        first_pass_done = 0
+
+        # 批量处理初步翻译
+        INITIAL_BATCH_SIZE = config.batch_size
+        # 按token预算打包，INITIAL_BATCH_SIZE 为每批条数上限
+        initial_batches = SubtitleProcessor.pack_batches(
+            [sub["content"] for sub in cleaned_subtitles], config, INITIAL_BATCH_SIZE
+        )
+
+        # 移除听障字幕内容
+        hi_filter = HearingImpairedFilter.from_config(config)
+        removed_hi_count = 0
+
+        # 并发调度各批次，最多同时保持 config.concurrency 个请求在途；共享调度器时并发上限对全部文件整体生效
+        dispatcher = dispatcher or BatchDispatcher(config.concurrency)
+
+        async def translate_initial_batch(batch_number):
+            nonlocal removed_hi_count, first_pass_done
+            i = initial_batches[batch_number][0]
+            batch = cleaned_subtitles[i:initial_batches[batch_number][-1] + 1]
+
+            if signals:
+                signals.progress.emit(f"处理批次 {batch_number + 1}/{len(initial_batches)}")
+            
+            # 提取批次字幕内容，先移除听障字幕内容再进行翻译
+            batch_texts = hi_filter.clean_many([sub['content'] for sub in batch])
+            
+            # 统计移除的听障字幕数量
+            removed_hi_count += sum(1 for sub, text in zip(batch, batch_texts) if text != sub['content'])
+            
+            # 构建批量翻译请求
+            system_prompt = f"""你是一位专业的{config.source_lang}到{config.target_lang}字幕翻译专家。
+请将提供的字幕批量翻译。
+请遵循以下规则:
+1. 保持翻译的准确性和流畅度
+2. 保持一致的翻译风格
+3. 在翻译过程中注意提取专业术语
+4. 提供简洁有效的译文，不过度解释或增加内容
+"""
+
+            user_prompt = f"""请翻译以下字幕，并从中提取专业术语:
+
+"""
+            for idx, text in enumerate(batch_texts):
+                user_prompt += f"[{idx+1}] {text}\n"
+                
+            user_prompt += f"""
+请以如下格式返回结果:
+1. 首先列出所有翻译结果，使用[编号]标记
+2. 然后提供你发现的术语表
+
+返回格式:
+[1] 翻译1
+[2] 翻译2
+...
+
+术语表:
+术语1 | 翻译1
+术语2 | 翻译2
+...
+"""
+            
+            try:
+                # 发送请求进行初步翻译
+                if signals:
+                    signals.progress.emit(f"发送初步翻译请求...")
+
+                # 共用任务级API客户端，请求失败时抛出异常，由下方统一记录
+                result = await api_client.chat_completion(
+                    [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.3,
+                    timeout=180
+                )
+                response_text = result["choices"][0]["message"]["content"]
+                
+                # 提取翻译结果和术语，每条译文在空行处结束，避免把后面的术语表并入最后一条
+                for number, content in SubtitleProcessor.tokenize_batch_response(response_text, stop_at_blank_line=True):
+                    idx = number - 1
+                    if 0 <= idx < len(batch):
+                        first_pass_translations[i + idx] = content
+                # 无法提取到的翻译保持为空字符串
+                first_pass_done += len(batch)
+                
+                # 提取术语
+                terminology_match = re.search(r'术语表[：:]\s*(.*?)$', response_text, re.DOTALL)
+                if terminology_match:
+                    terms_text = terminology_match.group(1)
+                    term_pattern = r'(.*?)\s*[\|丨]\s*(.*?)(?=\n|$)'
+                    for term_match in re.finditer(term_pattern, terms_text):
+                        source_term = term_match.group(1).strip()
+                        target_term = term_match.group(2).strip()
+                        if source_term and target_term:
+                            terminology_dict[source_term] = target_term
+    
+            except Exception as e:
+                error_message = f"阶段1处理批次 {batch_number + 1} 失败: {str(e)}"
+                if signals:
+                    signals.error.emit(error_message)
+
+        await dispatcher.run(list(range(len(initial_batches))), translate_initial_batch)
+
+        if signals:
+            signals.progress.emit(f"阶段1完成，共处理 {first_pass_done} 条字幕，提取 {len(terminology_dict)} 个术语")
+            signals.progress.emit(f"移除了 {removed_hi_count} 条字幕中的听障内容")
+        
+        # 检查是否有足够的翻译结果
+        if first_pass_done < len(cleaned_subtitles) * 0.5:
+            if signals:
+                signals.error.emit(f"初步翻译不完整，仅获得 {first_pass_done}/{len(cleaned_subtitles)} 条翻译")
+            return [], {}
+        
+        # 阶段2: 术语统一化和翻译反思
+        if signals:
+            signals.progress.emit("阶段2/3: 术语统一化和翻译反思...")
+        
+        # 整理术语表，合并重复项和近似术语
+        normalized_terminology = {}
+        if terminology_dict:
+            # 添加用户自定义术语
+            if config.custom_terminology:
+                for source, target in config.custom_terminology.items():
+                    terminology_dict[source] = target
+                if signals:
+                    signals.progress.emit(f"合并了 {len(config.custom_terminology)} 个用户自定义术语")
+            
+            # 将术语按长度降序排序（优先处理长术语）
+            sorted_terms = sorted(terminology_dict.items(), key=lambda x: len(x[0]), reverse=True)
+            
+            # 统一术语翻译
+            system_prompt = f"""你是一位{config.source_lang}到{config.target_lang}的专业术语专家。
+请审核和改进以下从字幕中提取的术语表，确保术语翻译的准确性和一致性。
+你需要:
+1. 合并重复或相似的术语
+2. 纠正不准确的翻译
+3. 标准化术语的翻译方式
+4. 删除不是真正术语的条目
+"""
+
+            terms_list = "\n".join([f"{source} | {target}" for source, target in sorted_terms])
+            user_prompt = f"""请审核以下术语表:
+
+{terms_list}
+
+请返回改进后的术语表，格式为:
+术语1 | 翻译1
+术语2 | 翻译2
+...
+"""
+            
+            try:
+                # 发送请求优化术语表
+                api_endpoint = f"{config.api_host}/v1/chat/completions"
+                
+                if signals:
+                    signals.progress.emit(f"术语标准化API请求: {api_endpoint}")
+                
+                result = await api_client.chat_completion(
+                    [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.2,
+                    timeout=60
+                )
+                response_text = result["choices"][0]["message"]["content"]
+                
+                # 提取标准化的术语表
+                term_pattern = r'(.*?)\s*[\|丨]\s*(.*?)(?=\n|$)'
+                for term_match in re.finditer(term_pattern, response_text):
+                    source_term = term_match.group(1).strip()
+                    target_term = term_match.group(2).strip()
+                    if source_term and target_term:
+                        normalized_terminology[source_term] = target_term
+                
+                if signals:
+                    signals.progress.emit(f"术语标准化完成，共 {len(normalized_terminology)} 个术语")
+            
+            except Exception as e:
+                error_message = f"术语标准化失败: {str(e)}"
+                if signals:
+                    signals.error.emit(error_message)
+                # 使用原始术语表作为备份
+                normalized_terminology = terminology_dict.copy()
+        
+        # 如果没有提取到术语，则创建一个空字典
+        if not normalized_terminology:
+            normalized_terminology = {}
+        
+        # 确保用户自定义术语的优先级最高
+        if config.custom_terminology:
+            for source, target in config.custom_terminology.items():
+                normalized_terminology[source] = target
+        
+        # 阶段3: 最终翻译、分段优化和时间轴调整
+        if signals:
+            signals.progress.emit("阶段3/3: 最终翻译、分段优化和时间轴调整...")
+        
+        # 按字幕位置寻址的结果存储，未完成的位置在最后统一补齐
+        final_translations = [None] * len(cleaned_subtitles)
+        
+        # 准备术语表提示词
+        terminology_prompt = ""
+        if normalized_terminology:
+            terminology_prompt = "术语表参考（确保一致使用）:\n"
+            for idx, (source, target) in enumerate(sorted(normalized_terminology.items(), key=lambda x: len(x[0]), reverse=True)[:30]):  # 限制数量
+                terminology_prompt += f"{idx+1}. {source}: {target}\n"
+        
+        # 批量进行最终翻译
+        FINAL_BATCH_SIZE = max(1, config.batch_size // 2)  # 第三阶段减小批次大小，确保更精确的翻译
+        # 第三阶段的输出包含编号、时间轴、原文和译文，按更高的输出比例打包
+        final_batches = SubtitleProcessor.pack_batches(
+            [sub["content"] for sub in cleaned_subtitles], config, FINAL_BATCH_SIZE,
+            output_ratio=2.5, extra_output_tokens=25
+        )
+        
+        async def translate_final_batch(batch_number):
+            i = final_batches[batch_number][0]
+            end = final_batches[batch_number][-1] + 1
+            batch = cleaned_subtitles[i:end]
+            first_pass_batch = first_pass_translations[i:end]
+            
+            if signals:
+                signals.progress.emit(f"最终翻译批次 {batch_number + 1}/{len(final_batches)}")
+            
+            # 构建最终翻译请求
+            system_prompt = f"""你是一位专业的{config.source_lang}到{config.target_lang}字幕翻译专家。
+请对初步翻译的字幕进行优化和调整。
+
+请遵循以下规则:
+1. 保持翻译的准确性和流畅度
+2. 确保每条字幕语义完整，长度适中（每行不超过60个字符）
+3. 使用术语表中的标准翻译
+4. 考虑时间轴信息，为每条字幕进行时间轴优化
+5. 优化时间轴时，请确保每个句子显示时长与原字幕中一致，尽量与原字幕时间轴匹配，尤其是未合并也未拆分的句子时间轴应保持不变
+6. 合并过短的字幕，拆分过长的字幕
+7. 调整断句时，要将原文和译文联合考虑，使最终的原文和译文行数相同
+8. 以结构化数据格式返回结果，包含原文、时间轴和翻译
+9. 保留完整的原文内容，不要修改原文
+10. 确保原文和翻译都包含在最终输出中
+"""
+
+            user_prompt = f"""请根据以下字幕的初步翻译和时间轴信息进行最终优化和调整。确保字幕语义完整、长度适中，且与原字幕时间轴匹配：
+
+"""
+            for idx, (sub, first_trans) in enumerate(zip(batch, first_pass_batch)):
+                # 将timedelta转换为秒数
+                start_seconds = sub['start'].total_seconds() if hasattr(sub['start'], 'total_seconds') else float(sub['start'])
+                end_seconds = sub['end'].total_seconds() if hasattr(sub['end'], 'total_seconds') else float(sub['end'])
+                duration = end_seconds - start_seconds
+                
+                time_info = f"{format_timecode(start_seconds)} --> {format_timecode(end_seconds)} (时长: {duration:,.2f}秒)"
+                user_prompt += f"[{idx+1}] 原文: {sub['content']}\n时间轴: {time_info}\n初步翻译: [{idx+1}] {first_trans}\n\n"
+            
+            user_prompt += f"""
+{terminology_prompt}
+
+请以结构化格式返回结果，每个字幕包含四部分信息：编号、时间轴、原文和翻译。
+格式如下：
+
+#1#
+TIME: 0:00:00.000 --> 0:00:00.000
+ORIG: 原始文本1
+TRANS: 翻译文本1
+
+#2#
+TIME: 0:00:00.000 --> 0:00:00.000
+ORIG: 原始文本2
+TRANS: 翻译文本2
+
+... 依此类推 ...
+
+严格按照这个格式，这样我们可以准确提取出每条字幕的完整信息。不要添加任何其他内容或解释。
+"""
+            
+            try:
+                
+                
+                # 发送最终翻译请求
+                result = await api_client.chat_completion(
+                    [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.3,  # 低温度以确保结果稳定
+                    timeout=180
+                )
+                response_text = result["choices"][0]["message"]["content"]
+                
+                
+                
+                # 使用正则表达式提取结构化信息
+                batch_translations = []
+                original_texts = []
+                time_infos = []
+                pattern = r'#(\d+)#\s*\nTIME:\s*(.*?)\s*\nORIG:\s*(.*?)\s*\nTRANS:\s*(.*?)(?=\n#\d+#|\Z)'
+                matches = list(re.finditer(pattern, response_text, re.DOTALL))
+                
+                if signals:
+                    signals.progress.emit(f"从响应中找到 {len(matches)} 个结构化翻译块")
+                
+                # 创建与batch大小相同的空列表
+                batch_translations = [""] * len(batch)
+                batch_originals = [""] * len(batch)
+                batch_time_infos = [""] * len(batch)
+                
+                # 填充提取到的翻译
+                for match in matches:
+                    idx = int(match.group(1)) - 1
+                    if 0 <= idx < len(batch):
+                        time_info = match.group(2).strip()
+                        original = match.group(3).strip()
+                        translation = match.group(4).strip()
+                        batch_translations[idx] = translation
+                        batch_originals[idx] = original
+                        batch_time_infos[idx] = time_info
+                        if signals:
+                            signals.progress.emit(f"提取到翻译 #{idx+1}: {translation[:20]}..." if len(translation) > 20 else f"提取到翻译 #{idx+1}: {translation}")
+                    else:
+                        if signals:
+                            signals.progress.emit(f"警告：找到索引为 {idx+1} 的翻译，但超出批次范围 {len(batch)}")
+                
+                # 检查空翻译
+                empty_count = sum(1 for t in batch_translations if not t)
+                if empty_count > 0 and signals:
+                    signals.progress.emit(f"警告：有 {empty_count}/{len(batch_translations)} 条翻译为空")
+                
+                # 记录处理后的翻译到日志
+                
+                
+                # 将翻译结果添加到最终列表，包含原文、翻译和时间轴信息
+                for j, (trans, orig, time_info) in enumerate(zip(batch_translations, batch_originals, batch_time_infos)):
+                    # 如果有空字段，使用原始数据填充
+                    if not trans:
+                        trans = first_pass_batch[j] if j < len(first_pass_batch) else ""
+                    if not orig:
+                        orig = batch[j]["content"] if j < len(batch) else ""
+                    
+                    # 组合为完整的信息条目
+                    final_translations[i + j] = {
+                        "translation": trans,
+                        "original": orig,
+                        "time_info": time_info
+                    }
+    
+            except Exception as e:
+                error_message = f"阶段3处理批次 {batch_number + 1} 失败: {str(e)}\n{traceback.format_exc()}"
+                if signals:
+                    signals.error.emit(error_message)
+                # 使用初步翻译作为备份
+                final_translations[i:i + len(batch)] = first_pass_batch[:len(batch)]
+
+        await dispatcher.run(list(range(len(final_batches))), translate_final_batch)
+
+        # 确保每条字幕都有对应的翻译结果
+        missing_count = sum(1 for t in final_translations if t is None)
+        if missing_count:
+            if signals:
+                signals.progress.emit(f"警告: 有 {missing_count}/{len(cleaned_subtitles)} 条字幕没有翻译结果")
+            # 填充缺失的翻译
+            for i, t in enumerate(final_translations):
+                if t is None:
+                    final_translations[i] = {
+                        "translation": "",
+                        "original": cleaned_subtitles[i]["content"],
+                        "time_info": ""
+                    }
+        
+        if signals:
+            signals.progress.emit(f"多阶段翻译完成，共翻译 {len(final_translations)} 条字幕，提取 {len(normalized_terminology)} 个术语")
+        
+        return final_translations, normalized_terminology
+
+    @staticmethod
+    def _parse_optimized_subtitles(response_text: str, original_subs: List[dict]) -> List[dict]:
+        """解析AI优化后的字幕分段结果"""
+        # 初始化结果列表
+        optimized_subs = []
+        # 使用与原始字幕相同的索引创建映射
+        original_indices = {sub['index']: sub for sub in original_subs}
+        
+        # 分割响应文本为单独的字幕块
+        subtitle_blocks = re.split(r'\n\s*\n', response_text)
+        
+        for block in subtitle_blocks:
+            if not block.strip():
+                continue
+                
+            # 尝试提取索引
+            index_match = re.match(r'\[(\d+)\]', block)
+            if not index_match:
+                continue
+                
+            try:
+                index = int(index_match.group(1))
+                if index not in original_indices:
+                    continue
+                    
+                # 获取原始字幕信息
+                original_sub = original_indices[index]
+                
+                # 提取内容（排除时间信息行）
+                content_lines = []
+                lines = block.strip().split('\n')
+                
+                # 跳过索引和时间信息行
+                content_start = False
+                for line in lines:
+                    if '-->' in line or re.match(r'\[\d+\]', line):
+                        continue
+                    content_start = True
+                    if content_start and line.strip():
+                        content_lines.append(line.strip())
+                
+                # 组合内容
+                content = '\n'.join(content_lines)
+                
+                # 创建新的字幕条目，保留原始时间信息
+                optimized_sub = original_sub.copy()
+                optimized_sub['content'] = content
+                
+                optimized_subs.append(optimized_sub)
+            except Exception:
+                continue
+        
+        # 如果解析结果不完整，使用原始字幕填充缺失部分
+        if len(optimized_subs) < len(original_subs):
+            processed_indices = {sub['index'] for sub in optimized_subs}
+            for sub in original_subs:
+                if sub['index'] not in processed_indices:
+                    optimized_subs.append(sub)
+                    
+        # 按原始索引排序
+        optimized_subs.sort(key=lambda x: x['index'])
+        
+        return optimized_subs
+
+    SHORT_SUBTITLE_CHARS = 3  # 内容不超过此字符数的字幕视为短字幕，可参与智能合并
+    SMART_MERGE_MAX_GAP = 0.5  # 智能合并时相邻字幕的最大间隔（秒）
+    SMART_MERGE_MAX_DURATION = 5.0  # 智能合并后字幕的最长时长（秒）
+    _SENTENCE_SPLIT_PATTERN = re.compile(r'([。！？.!?]+)')
+    _COMMA_SPLIT_PATTERN = re.compile(r'([，,、]+)')
+
+    @staticmethod
+    def preprocess_subtitles(subtitles, hi_filter: Optional["HearingImpairedFilter"] = None,
+                             max_time_diff: float = 1.0, max_word_per_sub: int = 25,
+                             min_chars: int = 10, max_chars: int = 60,
+                             stats: Optional[Dict[str, int]] = None) -> List[Cue]:
+        """一次流式处理完成全部预处理：清理听障标记 → 合并相同的连续字幕 → 智能合并短字幕 → 拆分过长字幕
+
+        结果与依次调用 merge_similar_consecutive_subtitles、smart_merge_subtitles、
+        balance_subtitle_length 相同，参数含义见 iter_preprocessed_subtitles。
+
+        Returns:
+            处理后的字幕列表
+        """
+        return list(SubtitleProcessor.iter_preprocessed_subtitles(
+            subtitles, hi_filter=hi_filter, max_time_diff=max_time_diff,
+            max_word_per_sub=max_word_per_sub, min_chars=min_chars,
+            max_chars=max_chars, stats=stats
+        ))
+
+    @staticmethod
+    def iter_preprocessed_subtitles(subtitles, hi_filter: Optional["HearingImpairedFilter"] = None,
+                                    max_time_diff: float = 1.0, max_word_per_sub: int = 25,
+                                    min_chars: int = 10, max_chars: int = 60,
+                                    stats: Optional[Dict[str, int]] = None):
+        """预处理的生成器形式：字幕处理完一条就产出一条，并直接赋予最终编号
+
+        各步骤串联为生成器，字幕逐条流过，每条只处理一次。输入也可以是惰性的迭代器
+        （例如 srt.parse 的结果），调用方可以在文件尾部还未处理时就开始使用已产出的字幕。
+
+        Args:
+            subtitles: 字幕列表（Cue 或字典）
+            hi_filter: 听障标记清理器，为None时跳过清理步骤
+            max_time_diff: 合并相同字幕的最大时间间隔（秒）
+            max_word_per_sub: 智能合并的每个字幕最大词数
+            min_chars: 最小字符数
+            max_chars: 最大字符数（Netflix标准）
+            stats: 可选字典，生成器耗尽时写入各步骤的统计：hearing_impaired、merged、smart_merged、split
+
+        Yields:
+            处理后的字幕，编号从1开始连续递增
+        """
+        counts = {"input": 0, "hearing_impaired": 0, "cleaned": 0, "merged": 0, "smart_merged": 0}
+        
+        def cleaned_cues():
+            for sub in subtitles:
+                cue = Cue.coerce(sub)
+                counts["input"] += 1
+                if hi_filter is not None:
+                    content = hi_filter.clean(cue.content)
+                    if content != cue.content:
+                        counts["hearing_impaired"] += 1
+                        cue = Cue(cue.index, content, cue.start_us, cue.end_us)
+                    # 过滤掉清理后内容为空的字幕
+                    if not cue.content.strip():
+                        continue
+                counts["cleaned"] += 1
+                yield cue
+        
+        def counted(cues, key):
+            for cue in cues:
+                counts[key] += 1
+                yield cue
+        
+        merged = counted(SubtitleProcessor._merge_similar_stage(cleaned_cues(), max_time_diff), "merged")
+        smart_merged = counted(SubtitleProcessor._smart_merge_stage(merged, max_word_per_sub), "smart_merged")
+        produced = 0
+        for cue in SubtitleProcessor._balance_stage(smart_merged, max_chars):
+            produced += 1
+            cue.index = produced
+            yield cue
+        
+        if stats is not None:
+            stats["hearing_impaired"] = counts["hearing_impaired"]
+            stats["merged"] = counts["cleaned"] - counts["merged"]
+            stats["smart_merged"] = counts["merged"] - counts["smart_merged"]
+            stats["split"] = produced - counts["smart_merged"]
+
+    @staticmethod
+    def _merge_similar_stage(cues, max_time_diff: float):
+        """合并相同连续字幕的流式步骤：当前字幕与下一条内容相同且间隔不超过 max_time_diff 时延长结束时间"""
+        pending = None
+        pending_content = ""
+        for cue in cues:
+            if (pending is not None and cue.content.strip() == pending_content and
+                    (cue.start_us - pending.end_us) / 1000000 <= max_time_diff):
+                pending.end_us = cue.end_us
+                continue
+            if pending is not None:
+                yield pending
+            pending = cue.copy()
+            pending_content = pending.content.strip()
+        if pending is not None:
+            yield pending
+
+    @staticmethod
+    def _smart_merge_stage(cues, max_word_per_sub: int):
+        """智能合并的流式步骤：按间隔不超过 SMART_MERGE_MAX_GAP 的连续片段缓冲，每个片段处理一次"""
+        run = []
+        for cue in cues:
+            if run and (cue.start_us - run[-1].end_us) / 1000000 > SubtitleProcessor.SMART_MERGE_MAX_GAP:
+                yield from SubtitleProcessor._smart_merge_run(run, max_word_per_sub)
+                run = []
+            run.append(cue)
+        if run:
+            yield from SubtitleProcessor._smart_merge_run(run, max_word_per_sub)
+
+    @staticmethod
+    def _smart_merge_run(run: List[Cue], max_word_per_sub: int) -> List[Cue]:
+        """处理一个相邻间隔都很小的连续片段
+
+        从每个位置起，到片段末尾的字幕都是短字幕且总时长不超过 SMART_MERGE_MAX_DURATION 时合并为一条；
+        合并后过长则对半拆开分别处理。用"下一条长字幕的位置"和内容长度前缀和，每个位置的判断都是O(1)。
+        """
+        size = len(run)
+        stripped = [cue.content.strip() for cue in run]
+        # next_long[k]：k 及之后第一条非短字幕的位置
+        next_long = [size] * (size + 1)
+        for k in range(size - 1, -1, -1):
+            next_long[k] = k if len(stripped[k]) > SubtitleProcessor.SHORT_SUBTITLE_CHARS else next_long[k + 1]
+        prefix = [0] * (size + 1)
+        for k in range(size):
+            prefix[k + 1] = prefix[k] + len(stripped[k])
+        
+        out = []
+        
+        def merge_range(lo, hi):
+            i = lo
+            last = hi - 1
+            while i < hi:
+                if (i == last or next_long[i] <= last or
+                        (run[last].end_us - run[i].start_us) / 1000000 > SubtitleProcessor.SMART_MERGE_MAX_DURATION):
+                    out.append(run[i].copy())
+                    i += 1
+                    continue
+                # 检查合并后的内容是否过长，过长则对半拆分分别处理
+                if prefix[hi] - prefix[i] > max_word_per_sub * 2:  # 每个字符平均算2个字节
+                    middle = i + (hi - i) // 2
+                    merge_range(i, middle)
+                    merge_range(middle, hi)
+                else:
+                    out.append(Cue(run[i].index, "".join(stripped[i:hi]), run[i].start_us, run[last].end_us))
+                i = hi
+        
+        merge_range(0, size)
+        return out
+
+    @staticmethod
+    def _balance_stage(cues, max_chars: int):
+        """拆分过长字幕的流式步骤，拆分点的时间按已用字符数的前缀和比例分配"""
+        for sub in cues:
+            content = sub.content.strip()
+            
+            # 如果字幕长度在合理范围内，直接添加
+            if len(content) <= max_chars:
+                yield sub.copy()
+                continue
+                
+            # 需要拆分的过长字幕
+            sentences = SubtitleProcessor._SENTENCE_SPLIT_PATTERN.split(content)
+            # 重组句子（保留标点）
+            sentences = [''.join(sentences[i:i+2]) for i in range(0, len(sentences), 2)]
+            
+            if not sentences:  # 防止没有句子的情况
+                sentences = [content]
+                
+            # 如果只有一个句子但超过最大长度，尝试按逗号拆分
+            if len(sentences) == 1 and len(sentences[0]) > max_chars:
+                comma_parts = SubtitleProcessor._COMMA_SPLIT_PATTERN.split(sentences[0])
+                # 重组（保留逗号）
+                comma_parts = [''.join(comma_parts[i:i+2]) for i in range(0, len(comma_parts), 2)]
+                if comma_parts:
+                    sentences = comma_parts
+                    
+            # 如果仍然只有一个部分但超过最大长度，按字符数强制拆分
+            if len(sentences) == 1 and len(sentences[0]) > max_chars:
+                parts = []
+                current = sentences[0]
+                while len(current) > max_chars:
+                    # 尝试在空格处拆分
+                    space_idx = current[:max_chars].rfind(' ')
+                    if space_idx > 0:
+                        parts.append(current[:space_idx].strip())
+                        current = current[space_idx:].strip()
+                    else:
+                        # 无法在空格处拆分，按max_chars拆分
+                        parts.append(current[:max_chars])
+                        current = current[max_chars:]
+                if current:
+                    parts.append(current)
+                sentences = parts
+            
+            # 重新组合句子，确保每个字幕长度不超过最大值
+            current_content = ""
+            start_us = sub.start_us
+            consumed = 0  # sentences[:i] 的总长度
+            
+            for sentence in sentences:
+                length = len(sentence)
+                # 检查sentence是否为空字符串
+                if not sentence:
+                    continue
+                    
+                if len(current_content) + length <= max_chars:
+                    if current_content:
+                        current_content += " " if sentence[0].isalpha() else ""  # 仅对字母添加空格分隔
+                    current_content += sentence
+                else:
+                    if current_content:  # 保存累积的内容
+                        # 计算结束时间：按已处理的字符数比例分配
+                        progress = consumed / len(content)
+                        duration = (sub.end_us - sub.start_us) / 1000000
+                        end_us = sub.start_us + Cue.to_microseconds(timedelta(seconds=duration * progress))
+                        
+                        yield Cue(sub.index, current_content, start_us, end_us)
+                        
+                        # 为下一部分设置开始时间
+                        start_us = end_us
+                    
+                    # 开始新的累积
+                    current_content = sentence
+                consumed += length
+            
+            # 添加最后一部分
+            if current_content:
+                yield Cue(sub.index, current_content, start_us, sub.end_us)
+
+    @staticmethod
+    def merge_similar_consecutive_subtitles(subtitles: List[dict], max_time_diff: float = 1.0) -> List[dict]:
+        """合并内容完全相同且时间间隔小于指定值的连续字幕
+        
+        Args:
+            subtitles: 字幕列表
+            max_time_diff: 最大时间间隔（秒），默认为1.0秒
+            
+        Returns:
+            合并后的字幕列表
+        """
+        if not subtitles or len(subtitles) < 2:
+            return subtitles
+        
+        merged_subtitles = list(SubtitleProcessor._merge_similar_stage(map(Cue.coerce, subtitles), max_time_diff))
+        
+        # 重新编号字幕
+        for idx, sub in enumerate(merged_subtitles):
+            sub.index = idx + 1
+            
+        return merged_subtitles
+
+    @staticmethod
+    def should_merge_subtitles(subs: List[dict]) -> bool:
+        """判断一组字幕是否应该被合并
+        
+        检查字幕是否过短（单字/短词）且时间间隔很小
+        
+        Args:
+            subs: 连续的字幕列表
+            
+        Returns:
+            布尔值，表示是否应该合并
+        """
+        # 如果只有一个字幕，不需要合并
+        if len(subs) <= 1:
+            return False
+            
+        subs = [Cue.coerce(sub) for sub in subs]
+        
+        # 检查字幕是否都很短（例如，单字或短词）
+        short_subtitle_threshold = 3  # 字符数少于此阈值的字幕被视为短字幕
+        is_short = all(len(sub.content.strip()) <= short_subtitle_threshold for sub in subs)
+        
+        if not is_short:
+            return False
+            
+        # 检查时间间隔是否都很小
+        max_time_interval = 0.5  # 秒
+        for i in range(len(subs) - 1):
+            time_diff = (subs[i+1].start_us - subs[i].end_us) / 1000000
+            if time_diff > max_time_interval:
+                return False
+                
+        # 检查总时长是否在合理范围内（防止合并过多导致字幕过长）
+        total_duration = (subs[-1].end_us - subs[0].start_us) / 1000000
+        if total_duration > 5.0:  # 不合并总时长超过5秒的字幕组
+            return False
+            
+        return True
+
+    @staticmethod
+    def smart_merge_subtitles(subtitles: List[dict], max_word_per_sub: int = 25) -> List[dict]:
+        """智能合并字幕，处理单字或短语分散在多个字幕中的情况
+        
+        此方法首先识别应该合并的短字幕组，然后将它们合并成一个
+        语义完整的字幕，同时保留时间轴信息。
+        
+        Args:
+            subtitles: 字幕列表
+            max_word_per_sub: 每个字幕的最大词数，默认为25
+            
+        Returns:
+            合并后的字幕列表
+        """
+        if not subtitles or len(subtitles) < 2:
+            return subtitles
+        
+        result = list(SubtitleProcessor._smart_merge_stage(map(Cue.coerce, subtitles), max_word_per_sub))
+        
+        # 重新编号字幕
+        for idx, sub in enumerate(result):
+            sub.index = idx + 1
+            
+        return result
+
+    @staticmethod
+    def balance_subtitle_length(subtitles: List[dict], min_chars: int = 10, max_chars: int = 60) -> List[dict]:
+        """平衡字幕长度，拆分过长字幕，合并过短字幕
+        
+        按照Netflix标准，调整字幕长度，确保每行不超过max_chars个字符
+        同时尽量保持语义完整性
+        
+        Args:
+            subtitles: 字幕列表
+            min_chars: 最小字符数，默认10
+            max_chars: 最大字符数，默认60（Netflix标准）
+            
+        Returns:
+            平衡后的字幕列表
+        """
+        if not subtitles:
+            return []
+        
+        result = list(SubtitleProcessor._balance_stage(map(Cue.coerce, subtitles), max_chars))
+    
+        # 重新编号字幕
+        for idx, sub in enumerate(result):
+            sub.index = idx + 1
+        
+        return result
+
+    @staticmethod
+    def serialize_for_json(obj):
+        """将对象转换为可JSON序列化的格式"""
+        if isinstance(obj, timedelta):
+            return str(obj)
+        elif isinstance(obj, Cue):
+            return SubtitleProcessor.serialize_for_json(obj.to_dict())
+        elif isinstance(obj, dict):
+            return {k: SubtitleProcessor.serialize_for_json(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [SubtitleProcessor.serialize_for_json(item) for item in obj]
+        else:
+            return obj
+
+
+class Signal:
+    """不依赖Qt的简单信号，接口与 pyqtSignal 相同（connect/disconnect/emit），回调在发出信号的线程中同步执行"""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        """注册回调"""
+        self._callbacks.append(callback)
+
+    def disconnect(self, callback=None):
+        """移除指定回调，不指定时移除全部"""
+        if callback is None:
+            self._callbacks.clear()
+        elif callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def emit(self, *args):
+        """依次调用全部回调"""
+        for callback in list(self._callbacks):
+            callback(*args)
+
+
+class EngineSignals:
+    """翻译引擎的信号集合，属性与界面使用的 WorkerSignals 一致"""
+
+    def __init__(self):
+        self.progress = Signal()  # 进度信息
+        self.error = Signal()     # 错误信息
+        self.finished = Signal()  # 完成信号
+
+
+class TranslationEngine:
+    """字幕翻译引擎，不依赖Qt，可以在无界面环境中直接使用
+
+    进度通过 worker_signals 的回调发出，也可以用 iter_events() 以异步迭代器的方式获取；
+    run() 阻塞执行整个翻译流程，translate() 则在调用方的事件循环中执行。
+    """
+    
+    MAX_FOLLOWUP_ATTEMPTS = 2  # 批次中缺失/无效的行最多再单独补译的次数
+    RETRY_MAX_ATTEMPTS = 3  # 失败字幕重试时每条最多请求的次数
+    RETRY_MAX_BACKOFF = 30.0  # 重试退避的最长等待（秒）
+    PREPROCESS_CHUNK_SIZE = 500  # 边预处理边翻译时每次从预处理流中取出的字幕条数
+    PREPROCESS_PROGRESS_INTERVAL = 2000  # 预处理进度的汇报间隔（条）
+    
+    def __init__(self, config, api_client=None, dispatcher=None):
+        """初始化翻译引擎
+
+        Args:
+            config: 翻译配置
+            api_client: 可选，与其他引擎共享的API客户端（连接池和限速器），由调用方负责关闭
+            dispatcher: 可选，与其他引擎共享的批次调度器，多个文件共用同一个并发上限
+        """
+        self.config = config
+        self.should_stop = False  # 添加停止标志
+        self.subtitles = []
+        self.translations = []
+        self.failed_indices = []
+        self.custom_terminology = {}
+        self.worker_signals = EngineSignals()
+        self.input_file = ""
+        self.output_file = ""
+        self.api_client = api_client  # 整个任务共享的API客户端（连接池）
+        self.shared_api_client = api_client is not None
+        self.dispatcher = dispatcher
+        # 批量响应编号校验统计
+        self.numbering_stats = {"batches": 0, "remapped_batches": 0, "mismatched_batches": 0,
+                                "missing_lines": 0, "unexpected_lines": 0, "structured_fallbacks": 0}
+        
+    def stop_translation(self):
+        """停止翻译过程"""
+        self.should_stop = True
+        self.worker_signals.progress.emit("正在停止翻译...")
+        
+        # 已完成的批次在提交时已写入并 fsync 到断点日志，停止时无需另存进度；
+        # 启用恢复功能后重新翻译同一文件即可从断点续译
+        # 调度器检测到 should_stop 后不再发出新的请求，翻译流程结束时发出 finished 信号
+        
+    async def translate(self):
+        """在当前事件循环中执行完整的翻译流程，进度通过 worker_signals 发出"""
+        # 创建翻译处理对象
+        translator = SubtitleProcessor()
+        
+        # 设置信号连接
+        signals = EngineSignals()
+        signals.progress.connect(self.worker_signals.progress.emit)
+        signals.error.connect(self.worker_signals.error.emit)
+        
+        # 如果设置了自定义术语，确保添加到配置中
+        if hasattr(self, 'custom_terminology') and self.custom_terminology:
+            self.config.custom_terminology = self.custom_terminology
+            signals.progress.emit(f"使用自定义术语表（{len(self.custom_terminology)}项）")
+        
+        # 检查是否需要使用多阶段翻译
+        if self.config.multi_phase:
+            signals.progress.emit("使用多阶段翻译流程...")
+            # 多阶段流程需要完整的字幕列表，先在线程池中完成预处理
+            if not self.subtitles and self.input_file:
+                loop = asyncio.get_running_loop()
+                self.subtitles = await loop.run_in_executor(None, lambda: list(self.iter_input_subtitles(signals)))
+                if self.should_stop:
+                    signals.progress.emit("预处理已取消")
+                    return
+            await self.process_with_multi_phase(translator, signals)
+        else:
+            signals.progress.emit("使用标准翻译流程...")
+            await self.process_with_standard(translator, signals)
+        
+    def run(self):
+        """运行翻译处理的主方法（阻塞直到完成，结束时发出 finished 信号）"""
+        try:
+            asyncio.run(self.translate())
+                
+            # 发送完成信号
+            self.worker_signals.finished.emit()
+            
+        except Exception as e:
+            # 捕获并报告所有异常
+            error_msg = f"翻译过程中发生错误: {str(e)}\n{traceback.format_exc()}"
+            self.worker_signals.error.emit(error_msg)
+            
+            # 写入错误日志
+            try:
+                with open("error_log.txt", "a", encoding="utf-8") as f:
+                    f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {error_msg}\n")
+            except:
+                pass
+                
+            # 发送完成信号
+            self.worker_signals.finished.emit()
+    
+    async def iter_events(self):
+        """以异步迭代器的形式运行翻译，逐条产出 (类型, 消息)，类型为 "progress" 或 "error"
+
+        翻译在当前事件循环中执行，流程结束后迭代结束；流程中未捕获的异常在迭代结束时抛出。
+        线程池中发出的进度同样会转交到事件循环::
+
+            async for kind, message in engine.iter_events():
+                print(kind, message)
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        
+        def forward(kind):
+            return lambda message: loop.call_soon_threadsafe(events.put_nowait, (kind, message))
+        
+        on_progress, on_error = forward("progress"), forward("error")
+        self.worker_signals.progress.connect(on_progress)
+        self.worker_signals.error.connect(on_error)
+        task = asyncio.ensure_future(self.translate())
+        try:
+            while True:
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                # 流程已结束，把仍在排队转交的消息全部产出
+                await asyncio.sleep(0)
+                while not events.empty():
+                    yield events.get_nowait()
+                break
+            task.result()
+        finally:
+            if not task.done():
+                self.should_stop = True
+                task.cancel()
+            self.worker_signals.progress.disconnect(on_progress)
+            self.worker_signals.error.disconnect(on_error)
+        
+    def iter_input_subtitles(self, signals):
+        """在工作线程中读取并预处理输入文件，逐条产出处理好的字幕
+
+        解析与预处理都是惰性的，调用方取到前面的字幕时文件尾部尚未处理；
+        每处理 PREPROCESS_PROGRESS_INTERVAL 条汇报一次进度，收到停止请求后不再产出。
+        """
+        if not os.path.exists(self.input_file):
+            signals.error.emit(f"错误: 找不到输入文件 {self.input_file}")
+            return
+        
+        try:
+            with open(self.input_file, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        except Exception as e:
+            signals.error.emit(f"读取字幕文件失败: {str(e)}")
+            return
+        signals.progress.emit(f"开始预处理字幕文件，文件大小: {len(content)} 字节")
+        
+        # 清理听障字幕 → 合并相似连续字幕 → 智能合并短字幕 → 平衡字幕长度（拆分过长字幕），一次流式完成
+        preprocess_stats = {}
+        cues = SubtitleProcessor.iter_preprocessed_subtitles(
+            (Cue.from_srt(sub) for sub in srt.parse(content)),
+            hi_filter=HearingImpairedFilter.from_config(self.config),
+            max_time_diff=1.0,
+            min_chars=10,
+            max_chars=60,
+            stats=preprocess_stats
+        )
+        
+        count = 0
+        try:
+            for cue in cues:
+                if self.should_stop:
+                    signals.progress.emit(f"预处理已停止，已处理 {count} 条字幕")
+                    return
+                yield cue
+                count += 1
+                if count % self.PREPROCESS_PROGRESS_INTERVAL == 0:
+                    signals.progress.emit(f"预处理进度: 已处理 {count} 条字幕")
+        except Exception as e:
+            signals.error.emit(f"解析字幕文件失败: {str(e)}")
+            return
+        
+        if preprocess_stats["hearing_impaired"] > 0:
+            signals.progress.emit(f"已清理 {preprocess_stats['hearing_impaired']} 条字幕中的听障标记")
+        if preprocess_stats["merged"] > 0:
+            signals.progress.emit(f"已合并 {preprocess_stats['merged']} 条相似连续字幕")
+        if preprocess_stats["smart_merged"] > 0:
+            signals.progress.emit(f"已智能合并 {preprocess_stats['smart_merged']} 条短字幕为语义完整的字幕")
+        if preprocess_stats["split"] > 0:
+            signals.progress.emit(f"已拆分 {preprocess_stats['split']} 条过长字幕以符合Netflix标准")
+        signals.progress.emit(f"预处理完成，需要翻译的字幕数量: {count} 条")
+        
+    def create_api_client(self):
+        """创建API客户端
+
+        同一任务内只创建一次，之后的调用直接返回已有的客户端，保证所有请求复用同一个连接池。
+        """
+        if self.api_client is not None:
+            return self.api_client
+            
+        try:
+            api_key = self.config.get("api_key", "")
+            api_host = self.config.get("api_host", "")
+            model = self.config.get("model", "")
+            
+            # 更详细的检查和错误信息
+            if not api_key:
+                self.worker_signals.error.emit("错误: API密钥未设置")
+                return None
+                
+            if not model:
+                self.worker_signals.error.emit("错误: 模型名称未设置")
+                return None
+                
+            if not api_host:
+                self.worker_signals.error.emit("错误: API主机地址未设置")
+                return None
+                
+            # 添加更多调试信息
+            self.worker_signals.progress.emit(f"API配置: 主机={api_host}, 模型={model}")
+            self.worker_signals.progress.emit(f"API密钥前5个字符: {api_key[:5]}...")
+            
+            # 验证API主机地址格式
+            if not (api_host.startswith("http://") or api_host.startswith("https://")):
+                self.worker_signals.progress.emit(f"警告: API主机地址不以http://或https://开头，尝试添加https://")
+                api_host = f"https://{api_host}"
+            
+            # 移除API主机地址末尾的斜杠
+            if api_host.endswith("/"):
+                api_host = api_host[:-1]
+                
+            # 更新修正后的主机地址
+            self.worker_signals.progress.emit(f"使用最终API主机地址: {api_host}")
+            
+            self.api_client = APIClient.from_config(self.config)
+            return self.api_client
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            self.worker_signals.error.emit(f"创建API客户端失败: {str(e)}\n{error_detail}")
+            return None
+            
+    async def close_api_client(self):
+        """关闭任务共享的API客户端，释放连接池；外部传入的客户端由调用方关闭"""
+        if self.api_client is not None and not self.shared_api_client:
+            try:
+                await self.api_client.close()
+            finally:
+                self.api_client = None
+                
+    def translation_finished(self):
+        """翻译完成处理"""
+        self.worker_signals.finished.emit()
+        
+    def get_context_before(self, index, count=2):
+        """获取当前字幕之前的上下文"""
+        context = []
+        for i in range(max(0, index - count), index):
+            if i < len(self.subtitles):
+                context.append(self.subtitles[i]["content"])
+        return context
+        
+    def get_context_after(self, index, count=2):
+        """获取当前字幕之后的上下文"""
+        context = []
+        for i in range(index + 1, min(len(self.subtitles), index + count + 1)):
+            context.append(self.subtitles[i]["content"])
+        return context
+        
+    def construct_translation_request(self, text, context_before, context_after, 
+                                     source_lang, target_lang, netflix_style, terminology_consistency):
+        """构建翻译请求"""
+        system_prompt = f"""你是一个专业的{source_lang}到{target_lang}字幕翻译专家。请直接提供翻译结果，不要重复原文，不要添加任何前缀、解释或注释。
+请尊重以下翻译规则:
+1. 只翻译我提供的字幕文本，保持语义准确
+2. 翻译要自然流畅，符合目标语言习惯，不要生硬直译
+3. 保持术语一致性
+4. 严格保留我提供的编号格式 [数字]
+5. 只返回翻译后的文本，不要包含原文
+6. 不要添加任何解释或注释
+7. 不要添加"翻译："、"最终翻译："等前缀
+"""
+
+        # 提供上下文信息
+        context_text = ""
+        if context_before:
+            context_text += f"上文字幕:\n{chr(10).join(context_before)}\n\n"
+        if context_after:
+            context_text += f"下文字幕:\n{chr(10).join(context_after)}\n\n"
+
+        user_prompt = f"""请将以下字幕从{source_lang}翻译为{target_lang}:
+
+需要翻译的字幕: "{text}"
+
+{context_text}
+请直接提供翻译结果，不要输出原文，不要添加"翻译："等前缀，不要有任何解释或注释，只输出翻译后的文本。"""
+        
+        return {
+            "system_message": system_prompt,
+            "user_message": user_prompt
+        }
+        
+    def construct_batch_translation_request(self, texts, source_lang, target_lang, 
+                                          netflix_style, terminology_consistency, structured_output=False):
+        """构建批量翻译请求，字幕按批次内的相对编号 [1]..[n] 排列
+
+        structured_output 为True时要求模型返回 {"translations": [{"id": 编号, "translation": 译文}]} 格式的JSON
+        """
+        system_prompt = f"""你是一个专业的{source_lang}到{target_lang}字幕翻译专家。
+请遵循以下翻译规则:
+1. 只翻译提供的字幕文本，保持语义准确
+2. 翻译要自然流畅，符合目标语言习惯，不要生硬直译
+3. 保持术语一致性
+4. 严格保留提供的编号格式 [数字]
+5. 直接翻译，不要输出原文
+6. 不要添加任何解释、注释或前缀
+7. 不要出现"翻译："、"最终翻译"等文字
+8. 不要输出"根据您提供的规则"、"以下是翻译结果"等任何引导性文字
+9. 每个编号只对应一个翻译内容，不要混淆或重复编号
+10. 严格按照原始编号顺序翻译，不要跳过或重复编号
+11. 只输出翻译结果，不要有任何多余的文字
+12. 不要输出"根据时间轴和字幕长度要求"等任何解释性文字
+13. 只需直接输出格式为[编号] 翻译内容的结果，不需要任何其他内容
+14. 禁止在翻译内容前添加任何形式的说明或解释
+15. 即使是第一条翻译，也不要添加任何说明
+
+输出格式示例（正确的）:
+[1] 这是第一条翻译
+[2] 这是第二条翻译
+
+错误的输出示例:
+根据您提供的规则，以下是翻译结果：
+[1] 这是第一条翻译
+[2] 这是第二条翻译
+"""
+        
+        # 构建用户提示词：每批都从[1]开始编号，响应按批次内位置映射回字幕
+        formatted_texts = []
+        for number, text in enumerate(texts, 1):
+            formatted_texts.append(f"[{number}] {text}")
+        
+        batch_text = "\n".join(formatted_texts)
+        
+        user_prompt = f"""请将以下{source_lang}字幕批量翻译为{target_lang}:
+
+{batch_text}
+
+请注意:
+1. 直接翻译，不要输出原文
+2. 严格保持[数字]格式
+3. 不要添加任何解释或注释
+4. 不要输出"翻译："、"最终翻译"等任何前缀
+5. 不要输出"根据您提供的规则"等任何引导性文字
+6. 只输出翻译结果，不要有任何其他内容
+
+直接以下列格式返回结果:
+[1] 翻译内容1
+[2] 翻译内容2
+...
+"""
+        
+        if structured_output:
+            system_prompt = f"""你是一个专业的{source_lang}到{target_lang}字幕翻译专家。
+请遵循以下翻译规则:
+1. 只翻译提供的字幕文本，保持语义准确
+2. 翻译要自然流畅，符合目标语言习惯，不要生硬直译
+3. 保持术语一致性
+4. 直接翻译，不要输出原文
+5. 每条字幕对应一个翻译结果，id 与字幕编号 [数字] 相同，不要跳过或重复
+6. 只输出JSON对象，不要有任何其他文字
+
+输出格式:
+{{"translations": [{{"id": 1, "translation": "第一条翻译"}}, {{"id": 2, "translation": "第二条翻译"}}]}}
+"""
+            user_prompt = f"""请将以下{source_lang}字幕批量翻译为{target_lang}，以JSON格式返回:
+
+{batch_text}
+"""
+        
+        return {
+            "system_message": system_prompt,
+            "user_message": user_prompt
+        }
+        
+    def parse_structured_batch_response(self, response, expected_count):
+        """严格解析JSON格式的批量翻译响应
+
+        响应须为 {"translations": [{"id": 编号, "translation": 译文}, ...]}（也接受直接返回的数组），
+        编号为批次内的相对编号。任何不符合格式的情况都返回None，由调用方回退到编号格式解析。
+
+        Returns:
+            长度为 expected_count 的译文列表，格式不符时为None
+        """
+        text = response.strip()
+        if text.startswith("```"):
+            # 去掉模型偶尔包裹的 ```json 代码块
+            text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        
+        items = data.get("translations") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return None
+        
+        entries = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get("translation"), str):
+                return None
+            try:
+                number = int(item.get("id"))
+            except (TypeError, ValueError):
+                return None
+            if number in entries:
+                return None
+            entries[number] = item["translation"].strip()
+        
+        if not entries:
+            return None
+        return self.map_batch_entries(entries, expected_count)
+        
+    def process_translation_response(self, response):
+        """处理单条翻译响应，清理格式并提取翻译内容"""
+        if not response:
+            return ""
+
+        # 首先检查是否是常见的说明性文本模式
+        if self.is_common_error_response(response):
+            self.worker_signals.progress.emit("检测到说明性文本模式，尝试提取有效翻译内容")
+            
+            # 尝试查找可能的分隔点，如空行、数字标记等
+            lines = response.split('\n')
+            
+            # 如果有多行，查找第一个符合条件的行
+            for line_idx, line in enumerate(lines):
+                line = line.strip()
+                if not line:
+                    continue
+                    
+                # 检查这一行是否包含过多中文字符（说明性内容）
+                chinese_count = self.count_chinese_chars(line)
+                # 检查这一行是否是正常的翻译内容（15字以内或者包含标记）
+                if chinese_count <= 25 or re.match(r'^\[\d+\]|\d+[\.\:、]', line):
+                    # 从这一行开始截取
+                    response = '\n'.join(lines[line_idx:])
+                    self.worker_signals.progress.emit(f"从第{line_idx+1}行开始截取有效内容")
+                    break
+    
+        # 清理常见前缀
+        cleaned = self.clean_llm_response(response)
+        
+        # 再次检查结果是否合理
+        if cleaned:
+            # 按行检查每一行是否合理
+            lines = cleaned.split('\n')
+            valid_lines = []
+            
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                    
+                # 检查这一行是否包含过多中文字符
+                chinese_count = self.count_chinese_chars(line)
+                
+                # 如果单行超过15个中文字符，可能是说明内容
+                if chinese_count > 25 and not re.match(r'^\[\d+\]|\d+[\.\:、]', line):
+                    self.worker_signals.progress.emit(f"检测到过长行: {line[:25]}... ({chinese_count}字)")
+                    # 尝试提取有效内容
+                    valid_content = self.extract_valid_translation(line)
+                    if valid_content:
+                        valid_lines.append(valid_content)
+                else:
+                    valid_lines.append(line)
+            
+            # 重新组合有效行
+            if valid_lines:
+                cleaned = '\n'.join(valid_lines)
+            elif len(lines) > 0:
+                # 如果没有有效行，但有原始行，使用首行
+                cleaned = lines[0]
+                
+                # 如果首行仍然过长，截断它
+                chinese_count = self.count_chinese_chars(cleaned)
+                if chinese_count > 25:
+                    cleaned = self.truncate_chinese_text(cleaned, 25)
+        
+        return cleaned.strip()
+
+    def extract_valid_translation(self, text):
+        """从长文本中提取有效的翻译内容"""
+        if not text:
+            return ""
+        
+        # 方法1: 尝试通过冒号或引号分隔
+        for pattern in [r'[:：](.+)$', r'["""」』』](.*?)["""」』』]']:
+            match = re.search(pattern, text)
+            if match:
+                extracted = match.group(1).strip()
+                chinese_count = self.count_chinese_chars(extracted)
+                if 1 <= chinese_count <= 25:
+                    return extracted
+        
+        # 方法2: 尝试查找第一个句号或逗号，取其后内容
+        for sep in ['。', '，', '.', ',']:
+            parts = text.split(sep, 1)
+            if len(parts) > 1:
+                second_part = parts[1].strip()
+                chinese_count = self.count_chinese_chars(second_part)
+                if 1 <= chinese_count <= 25:
+                    return second_part
+        
+        # 方法3: 如果仍然没找到，尝试截断
+        return self.truncate_chinese_text(text, 25)
+
+    def truncate_chinese_text(self, text, max_chars):
+        """智能截断中文文本到指定字符数"""
+        if not text:
+            return ""
+        
+        # 统计中文字符
+        chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
+        if len(chinese_chars) <= max_chars:
+            return text
+        
+        # 找到第N个中文字符的位置
+        count = 0
+        cut_pos = 0
+        for i, char in enumerate(text):
+            if '\u4e00' <= char <= '\u9fff':
+                count += 1
+            if count == max_chars:
+                cut_pos = i + 1
+                break
+        
+        if cut_pos > 0:
+            # 尝试找到合适的断句点
+            for i in range(cut_pos, max(0, cut_pos-5), -1):
+                if i < len(text) and text[i] in ['。', '，', '.', ',', '!', '?', '；', ';']:
+                    return text[:i+1]
+        
+        # 如果没找到合适的断句点，直接截断并添加省略号
+        return text[:cut_pos] + "..."
+    
+    @staticmethod
+    def is_invalid_translation(translation):
+        """判断单条译文是否无效：为空、含"未翻译"标记或以#开头（与最终错误校正的判定一致）"""
+        if not isinstance(translation, str) or not translation.strip():
+            return True
+        return "未翻译" in translation or translation.strip().startswith("#")
+
+    def clean_batch_entry(self, index, content):
+        """清理批量响应中编号为 index 的单条翻译内容，去除说明性文本"""
+        # 进一步清理翻译内容
+        cleaned_content = self.clean_translation_content(content)
+        
+        # 检查是否合规
+        chinese_count = self.count_chinese_chars(cleaned_content)
+        
+        # 特别处理第一条翻译，因为它最容易包含说明性文本
+        if index == 1 and chinese_count > 25 and not '\n' in cleaned_content:
+            self.worker_signals.progress.emit(f"第一条翻译疑似包含说明性文本 ({chinese_count}字)")
+            # 应用更严格的过滤规则
+            if re.search(r'根据|翻译|调整|优化|确保|保持|字幕|提供|以下是|这是|按照|参考', cleaned_content[:25]):
+                self.worker_signals.progress.emit("检测到常见说明性文本特征，尝试提取有效内容")
+                cleaned_content = self.extract_valid_translation(cleaned_content)
+                # 如果还是过长，尝试使用更简洁的内容
+                if self.count_chinese_chars(cleaned_content) > 25:
+                    original_match = re.search(r'原文[""]?(.*?)[""]?$', content)
+                    if original_match:
+                        cleaned_content = original_match.group(1).strip()
+                        self.worker_signals.progress.emit(f"使用简洁提取内容: {cleaned_content}")
+        # 检查其他翻译
+        elif chinese_count > 25 and not '\n' in cleaned_content:
+            self.worker_signals.progress.emit(f"翻译 {index} 疑似包含非翻译内容 ({chinese_count}字)")
+            # 提取有效内容
+            cleaned_content = self.extract_valid_translation(cleaned_content)
+        
+        # 额外检查，确保不是说明
+        if self.is_explanation_text(cleaned_content):
+            self.worker_signals.progress.emit(f"翻译 {index} 仍然包含说明性文本，尝试深度清理")
+            # 应用深度清理
+            cleaned_content = self.deep_clean_explanation(cleaned_content)
+        
+        return cleaned_content
+
+    def report_numbering_stats(self):
+        """输出批量响应编号校验的统计结果"""
+        stats = self.numbering_stats
+        if not stats["batches"]:
+            return
+        self.worker_signals.progress.emit(
+            f"编号校验: 共 {stats['batches']} 批，编号偏移已纠正 {stats['remapped_batches']} 批，"
+            f"编号不匹配 {stats['mismatched_batches']} 批（缺少 {stats['missing_lines']} 条，多出/越界 {stats['unexpected_lines']} 条）"
+        )
+        if stats["structured_fallbacks"]:
+            self.worker_signals.progress.emit(f"JSON输出: {stats['structured_fallbacks']} 批不符合格式，已回退到编号格式解析")
+
+    def map_batch_entries(self, entries, expected_count):
+        """把按批次内编号解析出的译文映射回批次位置，并校验编号
+
+        请求中每批字幕都从 [1] 开始编号，正常情况下响应中的编号恰好是 1..expected_count。
+        如果模型沿用了全局编号等导致整体平移（编号连续且数量与批次一致），按平移量映射回来；
+        其余缺失或超出范围的编号不会错位填充，对应位置留空并计入编号不匹配统计。
+
+        Args:
+            entries: {编号: 译文}
+            expected_count: 批次中的字幕数量
+
+        Returns:
+            长度为 expected_count 的译文列表
+        """
+        numbers = sorted(entries)
+        offset = 0
+        if numbers and numbers[-1] > expected_count:
+            # 编号整体平移：连续、数量与批次相同
+            if len(numbers) == expected_count and numbers[-1] - numbers[0] + 1 == expected_count:
+                offset = numbers[0] - 1
+        
+        translations = [""] * expected_count
+        for number in numbers:
+            position = number - offset - 1
+            if 0 <= position < expected_count:
+                translations[position] = entries[number]
+        
+        mapped = sum(1 for number in numbers if 0 < number - offset <= expected_count)
+        missing = expected_count - mapped
+        unexpected = len(numbers) - mapped
+        
+        stats = self.numbering_stats
+        stats["batches"] += 1
+        if offset:
+            stats["remapped_batches"] += 1
+            self.worker_signals.progress.emit(f"编号整体偏移 {offset}（[{numbers[0]}]-[{numbers[-1]}]），已按批次内位置映射")
+        if missing or unexpected:
+            stats["mismatched_batches"] += 1
+            stats["missing_lines"] += missing
+            stats["unexpected_lines"] += unexpected
+            self.worker_signals.progress.emit(f"编号不匹配：批次应有 {expected_count} 条，缺少 {missing} 条，多出/越界 {unexpected} 条")
+        return translations
+
+    def process_batch_translation_response(self, response, expected_count):
+        """处理批量翻译响应，分离多条翻译结果"""
+        if not response:
+            return []
+        
+        # 首先检查响应是否包含说明性文本
+        if self.is_common_error_response(response):
+            self.worker_signals.progress.emit("检测到批量响应中包含说明性文本模式")
+            
+        # 单遍切分出各编号的译文，编号为批次内的相对编号 1..expected_count；第一个编号前的说明性文字被跳过
+        entries = {}
+        for index, content in SubtitleProcessor.tokenize_batch_response(response):
+            if index > 0:
+                # 进一步清理翻译内容
+                entries[index] = self.clean_batch_entry(index, content)
+    
+        # 按编号映射回批次内的位置，并校验编号是否与批次一致
+        translations = self.map_batch_entries(entries, expected_count) if entries else []
+    
+        # 如果没有找到匹配项，尝试按行分割
+        if not translations:
+            self.worker_signals.progress.emit("未找到编号标记，尝试按行分割翻译")
+            lines = response.split('\n')
+            valid_lines = []
+            
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                    
+                # 检查行是否包含过多中文字符
+                chinese_count = self.count_chinese_chars(line)
+                
+                # 不考虑非常长的行作为翻译内容
+                if chinese_count > 30:
+                    self.worker_signals.progress.emit(f"跳过过长行: {line[:20]}... ({chinese_count}字)")
+                    continue
+                    
+                # 跳过可能的说明性文本
+                if self.is_explanation_text(line):
+                    self.worker_signals.progress.emit(f"跳过说明性行: {line[:20]}...")
+                    continue
+                    
+                # 清理行内容
+                cleaned_line = self.clean_translation_content(line)
+                if cleaned_line:
+                    valid_lines.append(cleaned_line)
+            
+            # 使用有效行作为翻译
+            translations = valid_lines
+        
+        # 确保返回足够数量的翻译结果
+        while len(translations) < expected_count:
+            translations.append("")
+        
+        # 如果返回了过多结果，截断到预期数量
+        if len(translations) > expected_count:
+            translations = translations[:expected_count]
+        
+        # 最后对每个翻译再次应用clean_llm_response清理
+        for i in range(len(translations)):
+            if translations[i]:
+                translations[i] = self.clean_llm_response(translations[i])
+            
+            # 最终检查：确保没有常见的说明性文本特征
+            if i == 0 and len(translations[i]) > 30:
+                # 对第一条翻译进行特别严格的检查
+                if re.search(r'(根据|按照|如下|以下|这是).{0,10}(翻译|优化|调整)', translations[i]):
+                    self.worker_signals.progress.emit(f"最终检查：第一条翻译仍含说明性文本，尝试截断")
+                    # 尝试找到冒号后的内容
+                    colon_match = re.search(r'[:：].{0,5}(.{1,25})', translations[i])
+                    if colon_match:
+                        translations[i] = colon_match.group(1).strip()
+                    else:
+                        # 或者简单截断为15个字符
+                        translations[i] = self.truncate_chinese_text(translations[i], 25)
+    
+        return translations
+
+    def clean_translation_content(self, content):
+        """清理单条翻译内容"""
+        if not content:
+            return ""
+        
+        # 移除常见的前缀
+        content = _CONTENT_PREFIX_PATTERN.sub('', content).strip()
+        
+        # 移除引号
+        content = _CONTENT_QUOTE_PATTERN.sub('', content).strip()
+        
+        # 移除可能的注释
+        if '(' in content or '[' in content:
+            content = _CONTENT_NOTE_PATTERN.sub('', content).strip()
+        
+        return content
+
+    def clean_llm_response(self, response):
+        """清理LLM响应，移除前缀和格式化噪音"""
+        if not response:
+            return ""
+        
+        # 优先检查并移除"根据时间轴和字幕长度要求"这类特定解释性文本
+        response = _LLM_TIME_PREFIX_PATTERN.sub('', response)
+        
+        # 移除常见的前缀：规则需按顺序逐条应用，开头不匹配任何规则时整组跳过
+        if _LLM_ANY_PREFIX_PATTERN.match(response):
+            for prefix in _LLM_PREFIX_PATTERNS:
+                response = prefix.sub('', response)
+        
+        # 移除可能的注释或说明
+        if '注:' in response:
+            for note in _LLM_NOTE_PATTERNS:
+                response = note.sub('', response)
+        
+        # 移除以"根据..."开头的整句
+        response = _LLM_LEADING_SENTENCE_PATTERN.sub('', response)
+        
+        # 清理多余的空白字符
+        response = _WHITESPACE_RUN_PATTERN.sub(' ', response).strip()
+        
+        return response.strip()
+
+    def count_chinese_chars(self, text):
+        """计算文本中的中文字符数量"""
+        if not text:
+            return 0
+        # 使用Unicode范围匹配中文字符
+        chinese_char_count = len(_CHINESE_CHAR_PATTERN.findall(text))
+        return chinese_char_count
+        
+    async def retry_failed_positions(self, positions, texts, signals, api_client=None) -> Dict[int, str]:
+        """并发重试失败的字幕
+
+        失败的字幕按token预算合并成批次，在共享的调度器和限速器下并发发送；
+        批次出错或仍有缺失的行时，只把这些行按指数退避（带随机抖动）重新排队，
+        每条最多请求 RETRY_MAX_ATTEMPTS 次，退避等待期间不占用并发槽位。
+
+        Args:
+            positions: 需要重试的字幕位置（从0开始）
+            texts: 按位置索引的原文
+            signals: 进度信号
+            api_client: 使用的API客户端，默认为任务共享的客户端
+
+        Returns:
+            {位置: 译文}，只包含重试成功的字幕
+        """
+        positions = list(positions)
+        if not positions:
+            return {}
+        api_client = api_client or self.create_api_client()
+        dispatcher = self.dispatcher or BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+        backoff_base = max(0.1, float(self.config.get("delay", 1.0) or 0))
+        recovered = {}
+        
+        async def retry_batch(job):
+            batch = job["positions"]
+            attempt = job["attempt"]
+            request_data = self.construct_batch_translation_request(
+                [texts[pos] for pos in batch],
+                self.config.source_lang,
+                self.config.target_lang,
+                self.config.netflix_style,
+                self.config.terminology_consistency
+            )
+            try:
+                result = await api_client.chat_completion(
+                    [
+                        {"role": "system", "content": request_data["system_message"]},
+                        {"role": "user", "content": request_data["user_message"]}
+                    ],
+                    temperature=None,
+                    timeout=180
+                )
+                batch_translations = self.process_batch_translation_response(
+                    result["choices"][0]["message"]["content"], len(batch)
+                )
+            except Exception as e:
+                signals.error.emit(f"重试批次失败（第 {attempt + 1} 次）: {str(e)}")
+                batch_translations = [""] * len(batch)
+            
+            pending = []
+            for pos, trans in zip(batch, batch_translations):
+                if self.is_invalid_translation(trans):
+                    pending.append(pos)
+                else:
+                    recovered[pos] = trans
+            if pending and attempt + 1 < self.RETRY_MAX_ATTEMPTS:
+                delay = min(self.RETRY_MAX_BACKOFF, backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+                signals.progress.emit(f"{len(pending)} 条字幕重试未成功，{delay:.1f} 秒后再次重试")
+                dispatcher.spawn(retry_batch, {"positions": pending, "attempt": attempt + 1}, delay=delay)
+        
+        packed = SubtitleProcessor.pack_batches([texts[pos] for pos in positions], self.config, self.config.batch_size)
+        jobs = [{"positions": [positions[k] for k in group], "attempt": 0} for group in packed]
+        signals.progress.emit(f"并发重试 {len(positions)} 条失败的字幕，共 {len(jobs)} 批")
+        await dispatcher.run(jobs, retry_batch)
+        signals.progress.emit(f"重试完成: 成功 {len(recovered)} 条，仍失败 {len(positions) - len(recovered)} 条")
+        return recovered
+        
+    async def retry_failed_translations(self, api_client):
+        """重试失败的翻译（failed_indices 为从0开始的位置）"""
+        if not self.failed_indices:
+            return
+        recovered = await self.retry_failed_positions(
+            self.failed_indices, [sub["content"] for sub in self.subtitles], self.worker_signals, api_client
+        )
+        for pos, translation in recovered.items():
+            self.translations[pos] = translation
+        self.failed_indices = [pos for pos in self.failed_indices if pos not in recovered]
+        
+    async def test_api_connection(self):
+        """测试API连接是否正常"""
+        self.worker_signals.progress.emit("测试API连接...")
+        
+        try:
+            api_client = self.create_api_client()
+            if not api_client:
+                self.worker_signals.error.emit("无法创建API客户端")
+                return False
+            # 共享的客户端只需测试一次
+            if api_client.connection_verified:
+                return True
+                
+            # 使用一个简单的测试消息
+            test_message = "Hello, please respond with 'API connection successful'"
+            response = await api_client.chat(test_message)
+            
+            self.worker_signals.progress.emit(f"API测试响应: {response}")
+            
+            api_client.connection_verified = True
+            if "success" in response.lower() or "成功" in response:
+                self.worker_signals.progress.emit("API连接测试成功!")
+                return True
+            else:
+                self.worker_signals.progress.emit("API连接测试返回了意外响应，但连接似乎正常")
+                return True
+                
+        except Exception as e:
+            self.worker_signals.error.emit(f"API连接测试失败: {str(e)}")
+            return False
+            
+    def write_translated_subtitles(self, output_file, translations):
+        """把译文与原始字幕合并写入最终字幕文件"""
+        try:
+            translations = list(translations or [])
+            
+            # 如果仍没有翻译结果，报错退出
+            if not translations:
+                self.worker_signals.error.emit("没有找到任何可用的翻译结果")
+                return False
+                
+            # 原始字幕
+            subtitles = self.subtitles
+            if not subtitles:
+                self.worker_signals.error.emit("找不到原始字幕数据")
+                return False
+                
+            # 确保翻译数量与字幕数量匹配
+            if len(translations) < len(subtitles):
+                self.worker_signals.error.emit(f"警告：翻译数量({len(translations)})少于字幕数量({len(subtitles)})")
+                # 补齐翻译
+                translations.extend([""] * (len(subtitles) - len(translations)))
+                
+            # 创建输出目录
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            
+            # 预处理字幕翻译，应用字符数量过滤规则
+            translated_subs = []
+            empty_translation_count = 0
+            identical_count = 0
+            filtered_by_length_count = 0
+            
+            for i, sub in enumerate(subtitles):
+                if i >= len(translations):
+                    break
+                    
+                # 获取原文和翻译
+                original_content = sub['content']
+                
+                # 处理新的字典格式，兼容旧格式
+                if isinstance(translations[i], dict):
+                    translation = translations[i].get("translation", "")
+                    # 如果有原文，优先使用LLM返回的原文
+                    if translations[i].get("original"):
+                        original_content = translations[i].get("original")
+                else:
+                    translation = translations[i]
+                
+                # 应用字符数量检测
+                if translation:
+                    # 检查中文字符数
+                    chinese_count = self.count_chinese_chars(translation)
+                    
+                    # 如果第一行超过15个汉字且没有换行，可能是非翻译内容
+                    if chinese_count > 25 and not "\n" in translation:
+                        self.worker_signals.progress.emit(f"字幕 {i+1} 疑似包含非翻译内容 ({chinese_count}字)")
+                        
+                        # 尝试分行处理
+                        lines = translation.split('\n')
+                        valid_translation = None
+                        
+                        for line in lines:
+                            line = line.strip()
+                            line_chinese_count = self.count_chinese_chars(line)
+                            if 1 <= line_chinese_count <= 25:
+                                valid_translation = line
+                                break
+                        
+                        if valid_translation:
+                            self.worker_signals.progress.emit(f"从字幕 {i+1} 中提取有效翻译: {valid_translation}")
+                            translation = valid_translation
+                        else:
+                            # 如果没找到合适的行但长度仍超过15字，尝试截断
+                            count = 0
+                            cut_pos = 0
+                            for j, char in enumerate(translation):
+                                if '\u4e00' <= char <= '\u9fff':
+                                    count += 1
+                                if count == 25:
+                                    cut_pos = j + 1
+                                    break
+                            
+                            if cut_pos > 0:
+                                translation = translation[:cut_pos] + "..."
+                                self.worker_signals.progress.emit(f"截断过长翻译: {translation}")
+                        
+                        filtered_by_length_count += 1
+                
+                # 检查翻译结果有效性
+                is_untranslated = False
+                if not translation:
+                    empty_translation_count += 1
+                    translation = f"[未翻译] {original_content}"
+                    is_untranslated = True
+                elif translation.lower() == original_content.lower():
+                    identical_count += 1
+                    translation = f"[未翻译] {original_content}"
+                    is_untranslated = True
+                elif re.search(r'\[\s*未翻译\s*\]', translation):
+                    # 已经被标记为未翻译，保持原样
+                    is_untranslated = True
+                elif self.is_common_error_response(translation):
+                    # 检测到常见错误响应
+                    self.worker_signals.progress.emit(f"字幕 {i+1} 检测到错误响应模式")
+                    translation = f"[未翻译] {original_content}"
+                    identical_count += 1
+                    is_untranslated = True
+                
+                # 检查未翻译字幕：如果是未翻译且没有原文，则跳过此字幕
+                if is_untranslated and not original_content.strip():
+                    self.worker_signals.progress.emit(f"字幕 {i+1} 未翻译且无原文，已跳过")
+                    continue
+                
+                # 决定内容格式
+                if hasattr(self, 'config'):
+                    # 获取配置选项
+                    show_original = getattr(self.config, 'show_original', False)
+                    clean_punct = getattr(self.config, 'clean_punctuation', False)
+                    
+                    # 先处理清理标点的问题
+                    cleaned_translation = translation
+                    cleaned_original = original_content
+                    
+                    if clean_punct:
+                        # 如果启用了清理标点，在完成翻译后用空格替换标点符号
+                        cleaned_translation = SubtitleProcessor.clean_punctuation(translation)
+                        cleaned_original = SubtitleProcessor.clean_punctuation(original_content)
+                        self.worker_signals.progress.emit(f"字幕 {i+1} 应用标点符号清理")
+                    
+                    # 再处理是否双语的问题
+                    if show_original:
+                        # 双语字幕模式
+                        content = f"{cleaned_translation}\n{cleaned_original}"
+                        self.worker_signals.progress.emit(f"字幕 {i+1} 使用双语模式")
+                    else:
+                        # 单语字幕模式
+                        content = cleaned_translation
+                else:
+                    # 默认双语且不清理标点
+                    content = f"{translation}\n{original_content}"
+                
+                # 创建字幕对象
+                new_sub = srt.Subtitle(
+                    index=sub['index'],
+                    start=sub['start'],
+                    end=sub['end'],
+                    content=content
+                )
+                translated_subs.append(new_sub)
+            
+            # 在最终处理阶段过滤掉未翻译且无原文的字幕
+            filtered_subs = []
+            skipped_count = 0
+            removed_untranslated_count = 0
+            empty_original_count = 0
+            
+            for sub in translated_subs:
+                content = sub.content
+                
+                # 检查是否是特定的"未翻译  \N"内容
+                if content == r"未翻译 \N":
+                    self.worker_signals.progress.emit(f"字幕 {sub.index} 内容为\"未翻译  \\N\"，已删除")
+                    removed_untranslated_count += 1
+                    continue
+                
+                # 检查是否是未翻译的内容
+                if "未翻译" in content:
+                    # 对于双语字幕，需要检查每一行
+                    lines = content.split('\n')
+                    has_content = False
+                    
+                    for line in lines:
+                        # 如果某一行不包含"[未翻译]"且有内容，则保留该字幕
+                        if "未翻译" not in line and line.strip():
+                            has_content = True
+                            break
+                        
+                        # 如果包含"[未翻译]"，检查是否在未翻译标记后有内容
+                        if "未翻译" in line:
+                            remaining = line.replace("未翻译", "").strip()
+                            if remaining:
+                                has_content = True
+                                break
+                    
+                    if not has_content:
+                        self.worker_signals.progress.emit(f"字幕 {sub.index} 完全未翻译且无内容，已跳过")
+                        skipped_count += 1
+                        continue
+                
+                # 检查是否有空原文内容的行 (双语模式下)
+                if '\n' in content:
+                    lines = content.split('\n')
+                    if len(lines) >= 2:
+                        # 检查原文是否为空或只包含HTML标签
+                        original_line = lines[1]
+                        # 移除所有HTML标签后检查是否为空
+                        stripped_original = re.sub(r'<[^>]+>', '', original_line).strip()
+                        if not stripped_original:
+                            self.worker_signals.progress.emit(f"字幕 {sub.index} 原文内容为空或只包含HTML标签，已删除")
+                            empty_original_count += 1
+                            continue
+                
+                # 保留有内容的字幕
+                filtered_subs.append(sub)
+            
+            # 更新序号
+            for i, sub in enumerate(filtered_subs, 1):
+                sub.index = i
+            
+            # 写入字幕文件
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(srt.compose(filtered_subs))
+            
+            # 打印统计信息
+            self.worker_signals.progress.emit(f"字幕写入完成: {output_file}")
+            self.worker_signals.progress.emit(f"字幕统计: 总计 {len(filtered_subs)} 条，空翻译 {empty_translation_count} 条，相同内容 {identical_count} 条，长度过滤 {filtered_by_length_count} 条，跳过 {skipped_count} 条，删除\"未翻译  \\N\" {removed_untranslated_count} 条，删除空原文 {empty_original_count} 条")
+            if hasattr(self, 'config'):
+                self.worker_signals.progress.emit(f"配置: 双语字幕: {'启用' if getattr(self.config, 'show_original', False) else '禁用'}, 清理标点: {'启用' if getattr(self.config, 'clean_punctuation', False) else '禁用'}")
+            
+            return True
+        
+        except Exception as e:
+            self.worker_signals.error.emit(f"写入字幕文件时出错: {str(e)}")
+            traceback_info = traceback.format_exc()
+            self.worker_signals.error.emit(traceback_info)
+            return False
+
+    def is_common_error_response(self, text):
+        """检测常见的错误响应模式"""
+        if not text:
+            return False
+            
+        # 检查开头是否为常见的错误响应模式
+        return _COMMON_ERROR_PATTERN.search(text) is not None
+
+    def add_custom_terminology(self, terminology_dict):
+        """添加用户自定义术语字典
+        
+        Args:
+            terminology_dict: 包含术语和翻译的字典，格式为 {原文术语: 翻译术语}
+        """
+        if not terminology_dict:
+            return
+            
+        if not hasattr(self, 'custom_terminology'):
+            self.custom_terminology = {}
+            
+        # 合并术语字典
+        self.custom_terminology.update(terminology_dict)
+        
+        # 确保配置中也包含自定义术语
+        if hasattr(self.config, 'custom_terminology'):
+            self.config.custom_terminology = self.custom_terminology
+        else:
+            # 如果配置中没有custom_terminology属性，可能是旧版本的配置类
+            setattr(self.config, 'custom_terminology', self.custom_terminology)
+            
+        self.worker_signals.progress.emit(f"已添加 {len(terminology_dict)} 项用户自定义术语")
+        
+    def clear_custom_terminology(self):
+        """清除所有用户自定义术语"""
+        if hasattr(self, 'custom_terminology'):
+            self.custom_terminology = {}
+            
+        if hasattr(self.config, 'custom_terminology'):
+            self.config.custom_terminology = {}
+            
+        self.worker_signals.progress.emit("已清除所有用户自定义术语")
+
+    async def process_with_multi_phase(self, translator, signals):
+        """使用多阶段翻译流程处理字幕"""
+        if not self.subtitles:
+            signals.error.emit("没有可供翻译的字幕")
+            return
+            
+        signals.progress.emit(f"开始多阶段翻译，共 {len(self.subtitles)} 条字幕...")
+        
+        try:
+            # 测试API连接
+            api_connection_successful = await self.test_api_connection()
+            if not api_connection_successful:
+                signals.error.emit("API连接测试失败，请检查API密钥和主机地址")
+                return
+                
+            # 创建API客户端
+            api_client = self.create_api_client()
+            if not api_client:
+                signals.error.emit("无法创建API客户端")
+                return
+                
+            signals.progress.emit("API连接测试成功，开始多阶段翻译流程...")
+            
+            # 使用多阶段翻译处理
+            translations, terminology_dict = await SubtitleProcessor.multi_phase_translate(
+                self.subtitles, self.config, signals, api_client=api_client,
+                dispatcher=self.dispatcher or BatchDispatcher(self.config.concurrency,
+                                                              should_stop=lambda: self.should_stop)
+            )
+            
+            if self.should_stop:
+                signals.error.emit("翻译过程被用户中断")
+                return
+                
+            # 处理空翻译等问题
+            empty_translations = 0
+            for i, t in enumerate(translations):
+                if isinstance(t, dict):
+                    if not t.get("translation", "").strip():
+                        empty_translations += 1
+                        # 使用原文作为备用
+                        translations[i]["translation"] = f"[未翻译] {self.subtitles[i]['content']}"
+                elif isinstance(t, str):
+                    if not t.strip():
+                        empty_translations += 1
+                        # 使用原文作为备用
+                        translations[i] = f"[未翻译] {self.subtitles[i]['content']}"
+            
+            if empty_translations > 0:
+                signals.progress.emit(f"检测到 {empty_translations} 条空翻译，已使用原文替代")
+            
+            # 将翻译结果存入实例变量
+            self.translations = translations
+            
+            # 将自定义术语添加到实例中
+            if terminology_dict:
+                self.add_custom_terminology(terminology_dict)
+            
+            # 执行最终错误校正
+            signals.progress.emit("开始执行最终错误校正...")
+            await self.final_error_correction(api_client)
+            
+            if not self.should_stop:
+                await self.segmentation_phase(signals, api_client)
+            
+            # 写入字幕文件
+            self.write_translated_subtitles(self.output_file, self.translations)
+            
+        except Exception as e:
+            error_message = f"多阶段翻译过程中出错: {str(e)}\n{traceback.format_exc()}"
+            signals.error.emit(error_message)
+        finally:
+            await self.close_api_client()
+
+    async def process_with_standard(self, translator, signals):
+        """使用标准翻译流程处理字幕
+
+        未预先设置字幕列表时在工作线程中边预处理输入文件边翻译，前面的批次不必等待整个文件处理完。
+        """
+        if not self.subtitles and not self.input_file:
+            signals.error.emit("没有可供翻译的字幕")
+            return
+            
+        if self.subtitles:
+            signals.progress.emit(f"开始标准翻译，共 {len(self.subtitles)} 条字幕...")
+        else:
+            signals.progress.emit(f"开始标准翻译: {self.input_file}")
+        
+        try:
+            # 测试API连接
+            api_connection_successful = await self.test_api_connection()
+            if not api_connection_successful:
+                signals.error.emit("API连接测试失败，请检查API密钥和主机地址")
+                return
+                
+            # 创建API客户端
+            api_client = self.create_api_client()
+            if not api_client:
+                signals.error.emit("无法创建API客户端")
+                return
+                
+            signals.progress.emit("API连接测试成功，开始翻译...")
+            
+            # 断点日志：每个批次完成后追加提交，重新启动同一任务时跳过已经翻译过的字幕
+            journal = CheckpointJournal.from_config(self.config, self.input_file, self.output_file, self.subtitles)
+            if journal and journal.entries:
+                signals.progress.emit(f"从断点日志恢复 {journal.resumed_batches} 个批次、{len(journal.entries)} 条不同原文的译文")
+            
+            # 使用批量处理翻译
+            batch_size = self.config.batch_size if hasattr(self.config, 'batch_size') else 40
+            # 字幕可以边预处理边到达：已设置字幕列表时直接使用，否则在翻译的同时预处理输入文件
+            if self.subtitles:
+                incoming = iter(self.subtitles)
+                self.subtitles = []
+            else:
+                incoming = self.iter_input_subtitles(signals)
+            # 按字幕位置寻址的结果存储，乱序完成的批次也能写回正确位置；随字幕到达而增长
+            translations = []
+            source_texts = []
+            self.failed_indices = []
+            dispatcher = self.dispatcher or BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+            hi_filter = HearingImpairedFilter.from_config(self.config)
+            memory = TranslationMemory.from_config(self.config)
+            
+            # 文件内去重：相同的规范化原文只翻译一次，结果分发给所有携带该文本的字幕
+            duplicates = {}  # 代表位置 -> 具有相同原文的全部位置
+            representative_of = {}  # 规范化原文 -> 代表位置
+            failed_representatives = set()  # 已判定失败的代表位置，之后到达的重复字幕同样记为失败
+            intake_stats = {"resumed": 0, "remembered": 0, "pending": 0, "batches": 0}
+            
+            async def produce_batches():
+                """分块取出预处理好的字幕，查询翻译记忆、去重并打包，凑满的批次立即交给调度器
+
+                每块的最后一批可能还能装下后续字幕，留到下一块一起打包，因此批次划分与一次性打包整个文件相同。
+                """
+                loop = asyncio.get_running_loop()
+                carry = []
+                while True:
+                    # 预处理放在线程池中执行，期间已派发的批次照常收发
+                    chunk = await loop.run_in_executor(
+                        None, lambda: list(itertools.islice(incoming, self.PREPROCESS_CHUNK_SIZE))
+                    )
+                    if self.should_stop:
+                        return
+                    start = len(self.subtitles)
+                    texts = hi_filter.clean_many([sub['content'] for sub in chunk])
+                    self.subtitles.extend(chunk)
+                    source_texts.extend(texts)
+                    translations.extend([""] * len(chunk))
+                    
+                    # 查询翻译记忆，命中的字幕不再发送给API
+                    remembered = memory.get_many(texts) if memory and texts else {}
+                    new_positions = []
+                    for pos in range(start, start + len(chunk)):
+                        key = TranslationMemory.normalize(source_texts[pos])
+                        resumed = journal.entries.get(key) if journal else None
+                        if resumed:
+                            translations[pos] = resumed
+                            intake_stats["resumed"] += 1
+                            continue
+                        cached = remembered.get(key)
+                        if cached:
+                            translations[pos] = cached
+                            intake_stats["remembered"] += 1
+                            continue
+                        intake_stats["pending"] += 1
+                        rep = representative_of.get(key)
+                        if rep is None:
+                            representative_of[key] = pos
+                            duplicates[pos] = [pos]
+                            new_positions.append(pos)
+                            continue
+                        # 代表字幕可能已经译完，直接复用；仍在翻译中的会在写回时分发过来
+                        duplicates[rep].append(pos)
+                        translations[pos] = translations[rep]
+                        if rep in failed_representatives:
+                            self.failed_indices.append(pos + 1)
+                    
+                    # 不同文本按token预算打包成批次，batch_size 为每批条数上限
+                    finished = not chunk
+                    candidates = carry + new_positions
+                    packed = SubtitleProcessor.pack_batches([source_texts[pos] for pos in candidates], self.config, batch_size)
+                    groups = [[candidates[k] for k in group] for group in packed]
+                    carry = groups.pop() if groups and not finished else []
+                    for positions in groups:
+                        intake_stats["batches"] += 1
+                        yield {"positions": positions, "attempt": 0, "label": str(intake_stats["batches"])}
+                    if finished:
+                        return
+            
+            structured_output = self.config.get("structured_output", False)
+            structured_extra = {"response_format": {"type": "json_object"}} if structured_output else {}
+            
+            followup_stats = {"truncated": 0, "split_requests": 0, "followups": 0, "followup_lines": 0}
+            
+            def request_followup(job, pending):
+                """把批次中未完成的行立即作为小批次补译，超过次数上限的记为失败"""
+                attempt = job["attempt"] + 1
+                if attempt > self.MAX_FOLLOWUP_ATTEMPTS:
+                    failed_representatives.update(pending)
+                    self.failed_indices.extend(same_pos + 1 for pos in pending for same_pos in duplicates[pos])
+                    return
+                followup_stats["followups"] += 1
+                followup_stats["followup_lines"] += len(pending)
+                signals.progress.emit(f"批次 {job['label']} 有 {len(pending)} 条未完成，立即补译（第 {attempt} 次）")
+                dispatcher.spawn(translate_batch, {"positions": pending, "attempt": attempt, "label": f"{job['label']}+{attempt}"})
+            
+            async def translate_batch(job):
+                positions = job["positions"]
+                current_batch = job["label"]
+                
+                signals.progress.emit(f"处理批次 {current_batch}, 从 {positions[0]+1} 到 {positions[-1]+1}")
+                
+                # 提取批次字幕内容
+                batch_texts = [source_texts[pos] for pos in positions]
+                
+                # 构建批量翻译请求
+                request_data = self.construct_batch_translation_request(
+                    batch_texts, 
+                    self.config.source_lang,
+                    self.config.target_lang,
+                    self.config.netflix_style,
+                    self.config.terminology_consistency,
+                    structured_output
+                )
+                
+                # 流式接收时逐条解析，每条译文一到达就写入结果并显示（JSON输出时在完整响应后统一解析）
+                received = {}
+                
+                def on_entry(number, content):
+                    if 1 <= number <= len(positions) and positions[number - 1] not in received:
+                        pos = positions[number - 1]
+                        received[pos] = self.clean_batch_entry(number, content)
+                        for same_pos in duplicates[pos]:
+                            translations[same_pos] = received[pos]
+                        signals.progress.emit(f"收到字幕 {pos + 1} 的译文: {received[pos]}")
+                
+                parser = IncrementalBatchParser(on_entry)
+                
+                try:
+                    # 发送API请求
+                    result = await api_client.chat_completion(
+                        [
+                            {"role": "system", "content": request_data["system_message"]},
+                            {"role": "user", "content": request_data["user_message"]}
+                        ],
+                        temperature=None,  # 使用模型默认温度
+                        timeout=180,
+                        on_delta=None if structured_output else parser.feed,
+                        **structured_extra
+                    )
+                    parser.finish()
+                    response_text = result["choices"][0]["message"]["content"]
+
+                    # 处理响应，结果与 positions 一一对应；JSON格式不符时回退到编号格式解析
+                    batch_translations = None
+                    if structured_output:
+                        batch_translations = self.parse_structured_batch_response(response_text, len(positions))
+                        if batch_translations is None:
+                            self.numbering_stats["structured_fallbacks"] += 1
+                            signals.progress.emit(f"批次 {current_batch} 的响应不是有效的JSON格式，回退到编号格式解析")
+                    if batch_translations is None:
+                        batch_translations = self.process_batch_translation_response(
+                            response_text,
+                            len(positions)
+                        )
+                    # 整体解析未得到的行使用流式阶段已收到的译文，无效的译文按缺失处理
+                    batch_translations = [
+                        trans or received.get(pos, "") for pos, trans in zip(positions, batch_translations)
+                    ]
+                    batch_translations = [
+                        "" if self.is_invalid_translation(trans) else trans for trans in batch_translations
+                    ]
+                    
+                    # 输出因max_tokens被截断：最后一条可能不完整，丢弃后把剩余部分拆成两半并发续译
+                    truncated = result["choices"][0].get("finish_reason") == "length"
+                    if truncated:
+                        followup_stats["truncated"] += 1
+                        completed = [k for k, trans in enumerate(batch_translations) if trans]
+                        if completed:
+                            batch_translations[completed[-1]] = ""
+                        remainder = [pos for pos, trans in zip(positions, batch_translations) if not trans]
+                        signals.progress.emit(f"批次 {current_batch} 输出被截断，保留 {len(positions) - len(remainder)} 条，剩余 {len(remainder)} 条拆分续译")
+                        if len(remainder) > 1:
+                            middle = len(remainder) // 2
+                            for part, suffix in ((remainder[:middle], "a"), (remainder[middle:], "b")):
+                                followup_stats["split_requests"] += 1
+                                dispatcher.spawn(translate_batch, {"positions": part, "attempt": job["attempt"], "label": f"{current_batch}{suffix}"})
+
+                    # 编号不匹配而缺失的行不用错位的内容填充，只把这些行立即补译
+                    missing = [pos for pos, trans in zip(positions, batch_translations) if not trans]
+                    if missing and not (truncated and len(missing) > 1):
+                        request_followup(job, missing)
+
+                    signals.progress.emit(f"批次 {current_batch} 翻译完成，成功处理 {len(positions) - len(missing)} 条字幕")
+
+                    # 写入整体翻译结果，并分发给重复的字幕
+                    for pos, trans in zip(positions, batch_translations):
+                        for same_pos in duplicates[pos]:
+                            translations[same_pos] = trans
+                    
+                    # 写入翻译记忆，并向断点日志提交本批次
+                    completed_pairs = {source_texts[pos]: trans for pos, trans in zip(positions, batch_translations) if trans}
+                    if memory:
+                        memory.put_many(completed_pairs)
+                    if journal:
+                        journal.commit(current_batch, completed_pairs)
+                        
+                except StreamStalledError as e:
+                    # 保留已经完整收到的有效行，只补译缺失的行
+                    signals.error.emit(f"批次 {current_batch} {str(e)}，保留已收到的 {len(received)}/{len(positions)} 条译文")
+                    accepted = {pos: trans for pos, trans in received.items() if not self.is_invalid_translation(trans)}
+                    if memory and accepted:
+                        memory.put_many({source_texts[pos]: trans for pos, trans in accepted.items()})
+                    if journal and accepted:
+                        journal.commit(current_batch, {source_texts[pos]: trans for pos, trans in accepted.items()})
+                    pending = [pos for pos in positions if pos not in accepted]
+                    if pending:
+                        request_followup(job, pending)
+                except Exception as e:
+                    signals.error.emit(f"批次 {current_batch} 处理失败: {str(e)}")
+                    # 整批失败时立即重新请求该批次，超过次数上限才标记为失败
+                    request_followup(job, positions)
+
+            input_budget, output_budget = SubtitleProcessor.token_budgets(self.config)
+            signals.progress.emit(
+                f"边预处理边翻译，按token预算（输入 {input_budget}，输出 {output_budget}）打包批次，最大并发数: {dispatcher.concurrency}"
+            )
+            try:
+                await dispatcher.run(produce_batches(), translate_batch)
+                
+                # 即时补译仍未成功的字幕（例如服务端短时故障）合并成批次，按指数退避并发重试
+                if failed_representatives and not self.should_stop:
+                    recovered = await self.retry_failed_positions(sorted(failed_representatives), source_texts, signals, api_client)
+                    recovered_indices = set()
+                    for pos, trans in recovered.items():
+                        for same_pos in duplicates[pos]:
+                            translations[same_pos] = trans
+                            recovered_indices.add(same_pos + 1)
+                    self.failed_indices = [idx for idx in self.failed_indices if idx not in recovered_indices]
+                    recovered_pairs = {source_texts[pos]: trans for pos, trans in recovered.items()}
+                    if memory:
+                        memory.put_many(recovered_pairs)
+                    if journal:
+                        journal.commit("retry", recovered_pairs)
+            finally:
+                if memory:
+                    memory.close()
+                if journal:
+                    journal.close()
+            
+            if not self.subtitles:
+                if not self.should_stop:
+                    signals.error.emit("没有可供翻译的字幕")
+                return
+            total = len(self.subtitles)
+            if intake_stats["resumed"]:
+                signals.progress.emit(f"断点续译: 跳过 {intake_stats['resumed']}/{total} 条已翻译的字幕")
+            if memory:
+                signals.progress.emit(f"翻译记忆命中 {intake_stats['remembered']}/{total} 条字幕")
+            if len(duplicates) < intake_stats["pending"]:
+                signals.progress.emit(
+                    f"文件内去重: {intake_stats['pending']} 条待翻译字幕中有 {len(duplicates)} 条不同文本，"
+                    f"少发送 {intake_stats['pending'] - len(duplicates)} 条"
+                )
+            signals.progress.emit(f"共 {total} 条字幕，并发翻译 {len(duplicates)} 条，分为 {intake_stats['batches']} 批")
+            self.report_numbering_stats()
+            if followup_stats["truncated"]:
+                signals.progress.emit(f"输出截断: {followup_stats['truncated']} 次，拆分续译请求 {followup_stats['split_requests']} 个")
+            if followup_stats["followups"]:
+                signals.progress.emit(f"即时补译: {followup_stats['followups']} 个请求，共 {followup_stats['followup_lines']} 条字幕")
+            
+            # 使用翻译结果生成字幕文件
+            if translations:
+                # 将翻译结果存入实例变量
+                self.translations = translations
+                
+                # 执行最终错误校正
+                signals.progress.emit("开始执行最终错误校正...")
+                await self.final_error_correction(api_client)
+                
+                if self.config.final_review and not self.should_stop:
+                    await self.final_review_phase(signals, api_client)
+                
+                if not self.should_stop:
+                    await self.segmentation_phase(signals, api_client)
+                
+                # 生成翻译后的字幕
+                translated_subs = []
+                
+                for i, sub in enumerate(self.subtitles):
+                    if i >= len(self.translations):
+                        signals.progress.emit(f"警告: 字幕 {i+1} 没有对应的翻译")
+                        continue
+                        
+                    # 获取翻译文本
+                    translation = self.translations[i]
+                    
+                    # 处理翻译文本
+                    original_content = sub['content'].strip()
+                    translation = translation.strip()
+                    
+                    # 检查是否有空翻译
+                    if not translation or (i + 1) in self.failed_indices:
+                        signals.progress.emit(f"警告: 字幕 {i+1} 翻译为空或失败")
+                        # 使用原文作为备用
+                        translation = f"[未翻译] {original_content}"
+                    
+                    # 检查翻译结果是否与原文完全相同
+                    elif translation.lower() == original_content.lower():
+                        signals.progress.emit(f"警告: 字幕 {i+1} 翻译结果与原文相同")
+                        # 标记为未翻译
+                        translation = f"[未翻译] {original_content}"
+                    
+                    # 根据配置决定是否显示原文
+                    if self.config.get("show_original", False):
+                        # 双语字幕模式
+                        if self.config.get("clean_punctuation", False):
+                            # 清理标点符号
+                            original_text = SubtitleProcessor.clean_punctuation(original_content)
+                            translated_text = SubtitleProcessor.clean_punctuation(translation)
+                            content = f"{translated_text}\n{original_text}"
+                        else:
+                            # 保留原始标点
+                            content = f"{translation}\n{original_content}"
+                    else:
+                        # 单语字幕模式
+                        if self.config.get("clean_punctuation", False):
+                            # 清理标点符号
+                            content = SubtitleProcessor.clean_punctuation(translation)
+                        else:
+                            # 保留原始标点
+                            content = translation
+                    
+                    # 创建新的字幕对象
+                    new_sub = srt.Subtitle(
+                        index=sub['index'],
+                        start=sub['start'],
+                        end=sub['end'],
+                        content=content
+                    )
+                    translated_subs.append(new_sub)
+                
+                # 写入字幕文件
+                with open(self.output_file, 'w', encoding='utf-8') as f:
+                    f.write(srt.compose(translated_subs))
+                
+                signals.progress.emit(f"翻译完成，已生成译文文件: {self.output_file}")
+                
+                # 全部成功后删除断点日志；被停止或有失败字幕的任务保留日志，下次启动时续译
+                if journal and not self.should_stop and not self.failed_indices:
+                    journal.complete()
+            else:
+                signals.error.emit("翻译失败，未获得有效的翻译结果")
+        
+        except Exception as e:
+            signals.error.emit(f"标准翻译过程中出错: {str(e)}\n{traceback.format_exc()}")
+        finally:
+            await self.close_api_client()
+
+    async def final_review_phase(self, signals, api_client=None):
+        """最终审校阶段：把（原文, 译文）按窗口批量发送审校，只应用模型返回的修改
+
+        只有本地质量估计达到风险阈值的字幕参与审校。窗口按token预算打包，在共享的调度器和限速器下并发发送；模型只返回需要修改的行，
+        没有修改的窗口几乎不产生输出。未翻译或失败的字幕不参与审校。
+        """
+        if not self.subtitles or not self.translations:
+            signals.error.emit("没有可用的字幕或翻译进行最终审校")
+            return False
+        
+        failed = set(self.failed_indices)
+        candidates = [
+            i for i in range(min(len(self.subtitles), len(self.translations)))
+            if self.translations[i] and not self.translations[i].startswith("[未翻译]") and (i + 1) not in failed
+        ]
+        # 本地质量估计筛选出可疑的字幕，只审校这些字幕
+        estimator = QualityEstimator.from_config(self.config, self.custom_terminology)
+        sources = [sub['content'] for sub in self.subtitles[:len(self.translations)]]
+        positions = estimator.select(sources, self.translations[:len(sources)], candidates)
+        if estimator.threshold > 0:
+            signals.progress.emit(f"质量估计: {len(candidates)} 条译文中有 {len(positions)} 条达到风险阈值 {estimator.threshold}，送去审校")
+        if not positions:
+            return True
+        
+        api_client = api_client or self.create_api_client()
+        dispatcher = self.dispatcher or BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+        review_texts = [f"{self.subtitles[i]['content']}\n{self.translations[i]}" for i in positions]
+        windows = [[positions[k] for k in group]
+                   for group in SubtitleProcessor.pack_batches(review_texts, self.config, output_ratio=0.5)]
+        stats = {"reviewed": 0, "improved": 0, "failed_windows": 0}
+        signals.progress.emit(f"开始最终审校: {len(positions)} 条字幕，分为 {len(windows)} 个窗口，最大并发数: {dispatcher.concurrency}")
+        
+        async def review_window(window):
+            request_data = self.construct_final_review_request(
+                [{"original": self.subtitles[i]['content'], "translation": self.translations[i]} for i in window],
+                self.config.source_lang,
+                self.config.target_lang
+            )
+            try:
+                result = await api_client.chat_completion(
+                    [
+                        {"role": "system", "content": request_data["system_message"]},
+                        {"role": "user", "content": request_data["user_message"]}
+                    ],
+                    temperature=None,
+                    timeout=180
+                )
+                changes = self.process_review_response(result["choices"][0]["message"]["content"], len(window))
+            except Exception as e:
+                stats["failed_windows"] += 1
+                signals.error.emit(f"审校字幕 {window[0] + 1}-{window[-1] + 1} 时出错: {str(e)}")
+                return
+            
+            stats["reviewed"] += len(window)
+            for number, revised in changes.items():
+                i = window[number - 1]
+                if revised != self.translations[i] and not self.is_invalid_translation(revised):
+                    self.translations[i] = revised
+                    stats["improved"] += 1
+            if changes:
+                signals.progress.emit(f"审校字幕 {window[0] + 1}-{window[-1] + 1} 完成，修改 {len(changes)} 条")
+        
+        try:
+            await dispatcher.run(windows, review_window)
+        except Exception as e:
+            signals.error.emit(f"最终审校过程中出错: {str(e)}\n{traceback.format_exc()}")
+            return False
+        
+        if self.should_stop:
+            signals.progress.emit("检测到停止请求，已终止审校")
+            return False
+        signals.progress.emit(
+            f"最终审校完成! 审校: {stats['reviewed']} 条，优化翻译: {stats['improved']} 条"
+            + (f"，失败窗口: {stats['failed_windows']} 个" if stats["failed_windows"] else "")
+        )
+        return True
+
+    async def segmentation_phase(self, signals, api_client=None):
+        """Netflix风格分段：对已完成的译文重新断行（config.netflix_style 启用时）
+
+        由 SubtitleProcessor.optimize_subtitle_segmentation 处理：segmentation_mode 为 "local" 时使用本地断行引擎，
+        否则请求模型断行，请求走共享的调度器和限速器。未翻译或失败的字幕不参与分段。
+        """
+        if not self.config.netflix_style or not self.subtitles or not self.translations:
+            return False
+        
+        failed = set(self.failed_indices)
+        positions = []
+        cues = []
+        for i in range(min(len(self.subtitles), len(self.translations))):
+            entry = self.translations[i]
+            translation = entry.get("translation", "") if isinstance(entry, dict) else entry
+            if (not translation or not translation.strip() or translation.startswith("[未翻译]") or (i + 1) in failed
+                    or translation.strip().lower() == self.subtitles[i]['content'].strip().lower()):
+                continue
+            cue = Cue.coerce(self.subtitles[i]).copy()
+            cue['content'] = translation
+            positions.append(i)
+            cues.append(cue)
+        if not cues:
+            return False
+        
+        signals.progress.emit(f"开始优化字幕分段: {len(cues)} 条译文")
+        dispatcher = self.dispatcher or BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+        optimized = await SubtitleProcessor.optimize_subtitle_segmentation(
+            cues, self.config, api_client=api_client or self.create_api_client(), dispatcher=dispatcher
+        )
+        changed = 0
+        for i, cue in zip(positions, optimized):
+            entry = self.translations[i]
+            current = entry.get("translation", "") if isinstance(entry, dict) else entry
+            if cue['content'] == current:
+                continue
+            if isinstance(entry, dict):
+                entry["translation"] = cue['content']
+            else:
+                self.translations[i] = cue['content']
+            changed += 1
+        signals.progress.emit(f"字幕分段优化完成，重新断行 {changed} 条")
+        return True
+
+    def construct_final_review_request(self, translation_pairs, source_lang, target_lang):
+        """构建批量审校请求，translation_pairs 为 {"original", "translation"} 列表，编号从1开始"""
+        system_prompt = f"""你是一个专业的{source_lang}到{target_lang}字幕翻译专家。
+请审校下面每条字幕的翻译质量，确保译文与原文在语义上完全对应。
+
+遵循以下规则:
+1. 只输出需要修改的字幕，格式为"[编号] 修正后的译文"，每条一行
+2. 译文已经准确通顺的字幕不要输出
+3. 全部字幕都无需修改时，只输出"无需修改"
+4. 每句字幕控制在25个汉字以内，保持简洁
+5. 不要重复原文，不要加入"译文："等前缀
+6. 不要添加任何开场白、解释、结束语或评论
+
+正确示例：
+[3] 修正后的译文
+[7] 修正后的译文
+"""
+        
+        items = "\n".join(
+            f"[{number}] 原文: {pair['original']}\n    译文: {pair['translation']}"
+            for number, pair in enumerate(translation_pairs, 1)
+        )
+        user_prompt = f"""审校以下 {len(translation_pairs)} 条字幕翻译:
+
+{items}
+
+请只返回需要修改的字幕及修正后的译文。"""
+        
+        return {
+            "system_message": system_prompt,
+            "user_message": user_prompt
+        }
+
+    def process_review_response(self, response, expected_count) -> Dict[int, str]:
+        """解析批量审校响应，返回 {窗口内编号: 修正后的译文}，只包含模型给出修改的行"""
+        changes = {}
+        for number, content in SubtitleProcessor.tokenize_batch_response(response or ""):
+            if not 0 < number <= expected_count:
+                continue
+            revised = self.clean_llm_response(self.clean_batch_entry(number, content))
+            if revised and not self.is_explanation_text(revised):
+                changes[number] = revised
+        return changes
+
+    def is_explanation_text(self, text):
+        """检查文本是否为说明性文本"""
+        if not text:
+            return False
+        
+        # 检查是否匹配任何说明性模式
+        if _EXPLANATION_PATTERN.search(text):
+            return True
+        
+        # 检查说明性词语密度
+        if len(text) <= 25:
+            return False
+        word_count = sum(1 for word in _EXPLANATION_WORDS if word in text)
+        
+        # 如果在前30个字符中出现超过3个说明性词语，可能是说明
+        return word_count >= 3
+
+    def deep_clean_explanation(self, text):
+        """深度清理说明性文本，提取实际翻译内容"""
+        if not text:
+            return ""
+        
+        # 尝试通过冒号分割
+        colon_parts = re.split(r'[:：]', text, 1)
+        if len(colon_parts) > 1 and self.is_explanation_text(colon_parts[0]):
+            # 冒号前是说明，取冒号后内容
+            cleaned = colon_parts[1].strip()
+            if cleaned and self.count_chinese_chars(cleaned) <= 25:
+                return cleaned
+        
+        # 尝试找到引号内容
+        quote_match = re.search(r'["""「」『』''\'\'](.*?)["""「」『』''\'\'"]', text)
+        if quote_match:
+            quoted = quote_match.group(1).strip()
+            if quoted:
+                return quoted
+        
+        # 尝试截断开头的说明性文本
+        for i in range(len(text)):
+            if i > 25 and not self.is_explanation_text(text[:i]):
+                remaining = text[i:].strip()
+                if remaining and self.count_chinese_chars(remaining) <= 25:
+                    return remaining
+        
+        # 如果上述方法都不成功，截断文本
+        return self.truncate_chinese_text(text, 25)
+
+    async def final_error_correction(self, api_client):
+        """最终错误校正阶段：检测并修复未翻译或异常的字幕"""
+        self.worker_signals.progress.emit("开始最终错误校正阶段...")
+        
+        # 检查是否有字幕和翻译结果
+        if not hasattr(self, 'subtitles') or not hasattr(self, 'translations') or not self.subtitles or not self.translations:
+            self.worker_signals.error.emit("没有可用的字幕或翻译进行错误校正")
+            return False
+        
+        try:
+            total_subtitles = len(self.subtitles)
+            translations = [
+                trans.get("translation", "") if isinstance(trans, dict) else (trans or "")
+                for trans in self.translations[:total_subtitles]
+            ]
+            translations += [""] * (total_subtitles - len(translations))
+            
+            # 每条字幕单独请求修复，只修复明确失败或多项特征同时异常的字幕
+            self.worker_signals.progress.emit(f"检查 {total_subtitles} 条字幕中的错误...")
+            estimator = QualityEstimator.from_config(self.config, self.custom_terminology)
+            problematic_indices = estimator.select([sub['content'] for sub in self.subtitles], translations,
+                                                   min_signals=QualityEstimator.CORRECTION_MIN_SIGNALS)
+            
+            if not problematic_indices:
+                self.worker_signals.progress.emit("未发现需要修复的错误字幕，最终校正阶段完成！")
+                return True
+                
+            self.worker_signals.progress.emit(f"发现 {len(problematic_indices)} 条需要修复的字幕，开始修复...")
+            
+            # 并发修复有问题的字幕
+            fixed = set()
+            dispatcher = self.dispatcher or BatchDispatcher(self.config.concurrency, should_stop=lambda: self.should_stop)
+            
+            async def fix_subtitle(idx):
+                # 获取上下文（前后各10行字幕）
+                context_start = max(0, idx - 10)
+                context_end = min(total_subtitles, idx + 11)
+                context_subtitles = self.subtitles[context_start:context_end]
+                
+                # 构建字幕格式
+                subtitle_blocks = []
+                for i, sub in enumerate(context_subtitles):
+                    original_idx = context_start + i
+                    
+                    # 获取原文和当前翻译
+                    original_content = sub['content']
+                    
+                    trans = self.translations[original_idx] if original_idx < len(self.translations) else ""
+                    if isinstance(trans, dict):
+                        current_translation = trans.get("translation", "")
+                    else:
+                        current_translation = trans
+                    
+                    # 格式化时间码
+                    start_time = format_timecode(sub['start'].total_seconds())
+                    end_time = format_timecode(sub['end'].total_seconds())
+                    
+                    # 创建字幕块
+                    subtitle_block = f"{original_idx + 1}\n{start_time} --> {end_time}\n{current_translation}\n{original_content}\n"
+                    subtitle_blocks.append(subtitle_block)
+                
+                subtitle_text = "\n".join(subtitle_blocks)
+                
+                # 构建系统提示和用户提示
+                system_message = """你是一位专业的字幕翻译修复专家。
+请修复以下字幕中存在问题的部分（用户指定序号的行）。
+
+请遵循以下规则:
+1. 只修改有问题的字幕行，如果有需要，有问题行的前后3行也可以进行修改调整以优化断句，但其他行应保持不变
+2. 使用上下文理解内容，确保翻译的连贯性和准确性
+3. 返回完整的修复后字幕块，包括未修改的行
+4. 确保每条字幕格式与原格式一致
+5. 如果是双语字幕（包含原文和译文），保持双语格式
+6. 修复后的字幕应与上下文保持一致的语言风格
+7. 确保时间轴信息正确（按照格式：小时:分钟:秒,毫秒）
+8. 不要添加任何额外的解释、注释或前缀
+9. 只返回修复后的字幕块，不要包含其他内容
+
+必须严格按照以下格式返回结果:
+
+<translation index="1">修复后的译文1</translation>
+<translation index="2">修复后的译文2</translation>
+...
+
+注意事项：
+- 只返回需要修复的字幕，不需要返回没有问题的字幕
+- index是字幕的序号，应该与原字幕序号一致
+- 不要添加任何额外的解释或注释，只返回XML标签包裹的翻译内容
+- 不要包含时间轴信息或原文内容，只需要返回翻译文本
+- 不要使用Markdown格式或其他标记语言"""
+
+                user_message = f"""以下是需要检查和修复的字幕块（每个字幕块包含字幕序号、时间码、译文和原文）：
+
+{subtitle_text}
+
+请修复序号为 {idx + 1} 的字幕（含有"未翻译"字样、以"#"开头，或译文被检查为可能有误）。
+
+仅输出修复后的字幕翻译结果，使用以下XML格式：
+<translation index="字幕序号">修复后的译文</translation>
+
+示例：
+<translation index="1272">在争吵中对方</translation>
+<translation index="1273">在争吵中</translation>
+
+注意：
+1. 只输出需要修复的字幕，不需要输出没有问题的字幕
+2. 字幕序号必须与原字幕序号完全匹配
+3. 不要包含任何解释、注释或其他内容
+4. 不要输出时间轴信息或原文，只输出译文"""
+
+                try:
+                    # 发送请求
+                    response = await api_client.chat(system_message + "\n\n" + user_message)
+                    
+                    # 解析响应，提取修复后的翻译
+                    fixed_translations = self.parse_fixed_translations(response)
+                    
+                    if fixed_translations:
+                        # 更新翻译结果
+                        for fixed_idx, fixed_text in fixed_translations.items():
+                            idx_num = int(fixed_idx) - 1  # 转换为0-based索引
+                            
+                            if idx_num < len(self.translations):
+                                if isinstance(self.translations[idx_num], dict):
+                                    self.translations[idx_num]["translation"] = fixed_text
+                                else:
+                                    self.translations[idx_num] = fixed_text
+                                    
+                                fixed.add(idx_num)
+                                self.worker_signals.progress.emit(f"已修复字幕 {fixed_idx}: {fixed_text}")
+                    
+                except Exception as e:
+                    self.worker_signals.error.emit(f"修复字幕 {idx+1} 时出错: {str(e)}")
+            
+            await dispatcher.run(problematic_indices, fix_subtitle)
+            if self.should_stop:
+                self.worker_signals.progress.emit("检测到停止请求，已终止错误修复")
+                return False
+            # 修复成功的字幕不再视为失败
+            self.failed_indices = [index for index in self.failed_indices if index - 1 not in fixed]
+            
+            self.worker_signals.progress.emit(f"最终错误校正完成，共修复 {len(fixed)} 条字幕！")
+            return True
+            
+        except Exception as e:
+            self.worker_signals.error.emit(f"最终错误校正过程中出错: {str(e)}")
+            return False
+    
+    def parse_fixed_translations(self, response):
+        """解析修复后的翻译响应"""
+        fixed_translations = {}
+        
+        # 使用正则表达式匹配<translation index="数字">内容</translation>格式
+        pattern = r'<translation index="(\d+)">(.*?)</translation>'
+        matches = re.findall(pattern, response, re.DOTALL)
+        
+        for idx, text in matches:
+            fixed_translations[idx] = text.strip()
+        
+        return fixed_translations
+
+
+class RateLimiter:
+    """自适应令牌桶限速器
+
+    同时维护"请求数/分钟"和"令牌数/分钟"两个令牌桶，限额为0表示不限制。
+    遇到HTTP 429/503时按乘性减小速率（AIMD），并遵守 Retry-After 与
+    x-ratelimit-* 响应头给出的等待时间；请求成功后逐步加性恢复，
+    当服务端报告仍有充足余量时直接恢复到上限，从而贴近服务商的真实限额运行。
+    """
+
+    BURST_SECONDS = 10  # 令牌桶容量对应的秒数，允许短时突发
+    MIN_RATE = 1.0  # 自动降速的下限（每分钟）
+    MAX_BACKOFF = 60.0  # 无 Retry-After 时的最长退避时间（秒）
+    UNLIMITED_AFTER = 20  # 未设置限额时，连续成功多少次后恢复为不限制
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 backoff_base: float = 1.0):
+        """初始化限速器
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，0表示不限制
+            tokens_per_minute: 每分钟令牌数上限，0表示不限制
+            backoff_base: 被限流且服务端未给出等待时间时的基础退避秒数
+        """
+        self.max_rpm = float(requests_per_minute or 0)
+        self.max_tpm = float(tokens_per_minute or 0)
+        # 当前生效的速率，会随限流反馈自动调整
+        self.rpm = self.max_rpm
+        self.tpm = self.max_tpm
+        self.backoff_base = max(0.1, float(backoff_base or 0))
+        self._request_level = self._capacity(self.rpm)
+        self._token_level = self._capacity(self.tpm)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._throttle_streak = 0
+        self._success_streak = 0
+        self._recent_requests = []  # 最近60秒内的请求时间，用于未设置限额时估算实际速率
+        self._lock = None
+
+    @classmethod
+    def from_config(cls, config):
+        """根据翻译配置创建限速器"""
+        return cls(config.get("requests_per_minute", 0) or 0,
+                   config.get("tokens_per_minute", 0) or 0,
+                   config.get("delay", 1.0) or 1.0)
+
+    def _capacity(self, rate: float) -> float:
+        """令牌桶容量"""
+        return max(1.0, rate * self.BURST_SECONDS / 60.0) if rate > 0 else 0.0
+
+    def _get_lock(self) -> asyncio.Lock:
+        """延迟创建锁，确保绑定到当前运行的事件循环"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _refill(self, now: float):
+        """按经过的时间补充两个令牌桶"""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm > 0:
+            self._request_level = min(self._capacity(self.rpm), self._request_level + elapsed * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._token_level = min(self._capacity(self.tpm), self._token_level + elapsed * self.tpm / 60.0)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """计算还需等待多久才能发出一个消耗 tokens 个令牌的请求"""
+        wait = max(0.0, self._blocked_until - now)
+        if self.rpm > 0 and self._request_level < 1:
+            wait = max(wait, (1 - self._request_level) * 60.0 / self.rpm)
+        if self.tpm > 0 and tokens > 0:
+            # 单个请求超过桶容量时，等桶满即可放行（允许欠账），避免永远等待
+            need = min(tokens, self._capacity(self.tpm))
+            if self._token_level < need:
+                wait = max(wait, (need - self._token_level) * 60.0 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens: int = 0):
+        """等待直到可以发送一个请求，并扣除相应的额度
+
+        Args:
+            tokens: 该请求预计消耗的令牌数
+        """
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm > 0:
+                self._request_level -= 1
+            if self.tpm > 0:
+                self._token_level -= tokens
+            self._recent_requests = [t for t in self._recent_requests if now - t < 60] + [now]
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """用响应中的实际用量校正令牌桶"""
+        if self.tpm > 0 and actual_tokens:
+            self._token_level -= actual_tokens - estimated_tokens
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> float:
+        """收到429/503时调用：乘性降速并暂停发送
+
+        Returns:
+            本次暂停的秒数
+        """
+        self._throttle_streak += 1
+        self._success_streak = 0
+        now = time.monotonic()
+        if self.rpm > 0:
+            self.rpm = max(self.MIN_RATE, self.rpm / 2)
+        else:
+            # 未设置限额时，以最近一分钟内实际发送速率的一半作为起点
+            recent = [t for t in self._recent_requests if now - t < 60]
+            span = max(1.0, now - min(recent)) if recent else 60.0
+            self.rpm = max(self.MIN_RATE, len(recent) * 60.0 / span / 2)
+            self._request_level = min(self._request_level, self._capacity(self.rpm))
+        if self.tpm > 0:
+            self.tpm = max(self.MIN_RATE, self.tpm / 2)
+        if retry_after is None:
+            retry_after = min(self.MAX_BACKOFF, self.backoff_base * (2 ** (self._throttle_streak - 1)))
+        self._blocked_until = max(self._blocked_until, now + retry_after)
+        return retry_after
+
+    def on_success(self, headers=None):
+        """请求成功时调用：根据速率限制响应头调整，并加性恢复速率"""
+        self._throttle_streak = 0
+        self._success_streak += 1
+        now = time.monotonic()
+        has_headroom = False
+
+        if headers:
+            for kind in ("requests", "tokens"):
+                limit = self._header_number(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = self._header_number(headers.get(f"x-ratelimit-remaining-{kind}"))
+                reset = self.parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+
+                # 服务端给出的上限即为真实限额
+                if limit:
+                    if kind == "requests" and (not self.max_rpm or limit < self.max_rpm):
+                        self.max_rpm = limit
+                    if kind == "tokens" and (not self.max_tpm or limit < self.max_tpm):
+                        self.max_tpm = limit
+                if remaining is not None:
+                    if remaining <= 0 and reset:
+                        self._blocked_until = max(self._blocked_until, now + reset)
+                    elif limit and remaining >= limit / 2:
+                        has_headroom = True
+
+        release = self._success_streak >= self.UNLIMITED_AFTER
+        self.rpm = self._recover(self.rpm, self.max_rpm, has_headroom, release)
+        self.tpm = self._recover(self.tpm, self.max_tpm, has_headroom, release)
+
+    @staticmethod
+    def _recover(rate: float, ceiling: float, has_headroom: bool, release: bool = False) -> float:
+        """加性恢复速率，不超过上限；余量充足时直接恢复到上限
+
+        未设置上限（ceiling 为0）时，限流后临时启用的速率在连续成功足够多次
+        （release 为真）后恢复为0，即重新不限制。
+        """
+        if rate <= 0:
+            return rate
+        if not ceiling:
+            if release:
+                return 0.0
+            return rate + max(1.0, rate * 0.05)
+        if has_headroom:
+            return ceiling
+        return min(ceiling, rate + max(1.0, ceiling * 0.05))
+
+    @staticmethod
+    def _header_number(value) -> Optional[float]:
+        """解析数字类型的响应头"""
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_duration(value) -> Optional[float]:
+        """解析 "1s"、"6m0s"、"120ms"、"0.5" 形式的时长，返回秒数"""
+        if value is None:
+            return None
+        value = str(value).strip()
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+        parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+        if not parts:
+            return None
+        return sum(float(number) * units[unit] for number, unit in parts)
+
+    @staticmethod
+    def parse_retry_after(value) -> Optional[float]:
+        """解析 Retry-After 响应头（秒数或HTTP日期），返回秒数"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_time = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_time.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class APIClient:
+    """API客户端，用于与模型API交互
+
+    一个任务内的所有LLM请求都通过同一个实例发送，共享同一个连接池：
+    TCP/TLS连接保持长连接复用，DNS解析结果会被缓存，任务结束时调用close()统一关闭。
+    所有请求在发送前经过限速器，被限流（429/503）时自动等待后重试。
+    启用流式输出时以SSE方式接收，按token间隔而不是整体超时判断连接是否卡住。
+    """
+    
+    MAX_THROTTLE_RETRIES = 5  # 被限流时的最大自动重试次数
+    
+    def __init__(self, api_key, api_base, model, max_connections=20, rate_limiter=None,
+                 stream=False, stream_idle_timeout=30.0, max_tokens=None, verify_ssl=True):
+        """初始化API客户端"""
+        if not api_key:
+            raise ValueError("API密钥不能为空")
+            
+        if not model:
+            raise ValueError("模型名称不能为空")
+            
+        self.api_key = api_key.strip()
+        self.api_base = api_base.strip() if api_base else "https://api.deepseek.com"
+        
+        # 确保API基础URL格式正确
+        if not (self.api_base.startswith("http://") or self.api_base.startswith("https://")):
+            self.api_base = f"https://{self.api_base}"
+            
+        # 移除末尾的斜杠
+        if self.api_base.endswith("/"):
+            self.api_base = self.api_base[:-1]
+            
+        self.model = model.strip()
+        self.max_connections = max(1, int(max_connections or 1))
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.stream = stream
+        self.stream_idle_timeout = stream_idle_timeout
+        self.max_tokens = max_tokens
+        self.verify_ssl = verify_ssl
+        self.session = None
+        self.connection_verified = False  # 连接测试是否已通过
+        # 累计用量，供多文件翻译汇总吞吐量
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        
+        print(f"API客户端初始化成功，使用API主机: {self.api_base}")
+        print(f"使用模型: {self.model}")
+        print(f"API密钥前5个字符: {self.api_key[:5]}...")
+
+    @classmethod
+    def from_config(cls, config):
+        """根据翻译配置创建API客户端，连接池大小与并发数匹配"""
+        concurrency = config.get("concurrency", 5) or 5
+        return cls(config.api_key, config.api_host, config.model,
+                   max_connections=max(10, concurrency * 2),
+                   rate_limiter=RateLimiter.from_config(config),
+                   stream=config.get("stream", False),
+                   stream_idle_timeout=config.get("stream_idle_timeout", 30.0),
+                   max_tokens=config.get("max_tokens"),
+                   verify_ssl=config.get("verify_ssl", True))
+
+    async def __aenter__(self):
+        await self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        
+    async def _ensure_session(self):
+        """确保会话已创建"""
+        if self.session is None or self.session.closed:
+            import aiohttp  # 按需导入：aiohttp 占核心模块导入耗时的大部分，只在真正发送请求时才需要
+            try:
+                # 默认校验服务器证书；只有明确关闭 verify_ssl 时（自签名证书的私有部署）才跳过校验
+                ssl_options = {} if self.verify_ssl else {"ssl": False}
+                connector = aiohttp.TCPConnector(
+                    limit=self.max_connections,  # 连接池大小
+                    limit_per_host=self.max_connections,
+                    ttl_dns_cache=600,  # 缓存DNS解析结果10分钟
+                    keepalive_timeout=120,  # 空闲连接保持2分钟，供后续批次复用
+                    enable_cleanup_closed=True,
+                    **ssl_options
+                )
+                self.session = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=60),  # 默认60秒超时
+                    connector=connector
+                )
+                print("创建了新的API会话")
+            except Exception as e:
+                print(f"创建会话时出错: {str(e)}")
+                raise
+        return self.session
+
+    def _headers(self):
+        """构建请求头"""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    @staticmethod
+    def build_messages(prompt):
+        """将不同格式的prompt转换为messages列表"""
+        if isinstance(prompt, str):
+            return [{"role": "user", "content": prompt}]
+        elif isinstance(prompt, list):
+            return prompt
+        elif isinstance(prompt, dict):
+            # 处理我们自定义的格式，包含system_message和user_message
+            return [
+                {"role": "system", "content": prompt.get("system_message", "")},
+                {"role": "user", "content": prompt.get("user_message", "")}
+            ]
+        print(f"无效的prompt格式: {type(prompt)}")
+        raise ValueError("无效的prompt格式")
+
+    async def chat_completion(self, messages, temperature=0.7, timeout=60, on_delta=None, **extra):
+        """发送chat/completions请求并返回完整的JSON结果
+
+        Args:
+            messages: 消息列表
+            temperature: 温度系数，为None时不发送，使用模型默认值
+            timeout: 本次请求的总超时时间（秒）；流式请求时为等待第一段数据的超时
+            on_delta: 可选回调 on_delta(text)，流式请求时每收到一段文本调用一次
+            **extra: 附加到请求体中的其他参数
+
+        Returns:
+            API返回的JSON字典（流式请求会被组装成相同的结构）
+
+        Raises:
+            StreamStalledError: 流式响应超过 stream_idle_timeout 秒没有新数据
+        """
+        session = await self._ensure_session()
+        payload = {
+            "model": self.model,
+            "messages": messages
+        }
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if self.stream:
+            payload["stream"] = True
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        payload.update(extra)
+        estimated_tokens = self.estimate_request_tokens(payload)
+
+        # 流式请求不设整体超时，由token间隔超时判断是否卡住
+        import aiohttp
+        if payload.get("stream"):
+            request_timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+        else:
+            request_timeout = aiohttp.ClientTimeout(total=timeout)
+
+        api_endpoint = f"{self.api_base}/v1/chat/completions"
+        for attempt in range(self.MAX_THROTTLE_RETRIES + 1):
+            await self.rate_limiter.acquire(estimated_tokens)
+            async with session.post(
+                api_endpoint,
+                headers=self._headers(),
+                json=payload,
+                timeout=request_timeout
+            ) as response:
+                if response.status in (429, 503):
+                    error_text = await response.text()
+                    retry_after = RateLimiter.parse_retry_after(response.headers.get("Retry-After"))
+                    wait = self.rate_limiter.on_throttled(retry_after)
+                    print(f"API限流: {response.status}，{wait:.1f} 秒后重试（第 {attempt + 1} 次）")
+                    if attempt < self.MAX_THROTTLE_RETRIES:
+                        continue
+                    raise Exception(f"API请求失败: {response.status} - {error_text}")
+                if response.status != 200:
+                    error_text = await response.text()
+                    print(f"API请求失败: {response.status} - {error_text}")
+                    raise Exception(f"API请求失败: {response.status} - {error_text}")
+                self.rate_limiter.on_success(response.headers)
+                if payload.get("stream") and response.content_type == "text/event-stream":
+                    result = await self._read_stream(response, timeout, self.stream_idle_timeout, on_delta)
+                else:
+                    result = await response.json()
+                    # 服务端不支持流式时会直接返回完整结果，同样交给回调
+                    if on_delta and result.get("choices"):
+                        on_delta(result["choices"][0]["message"]["content"] or "")
+                usage = result.get("usage") or {}
+                self.rate_limiter.record_usage(estimated_tokens, usage.get("total_tokens", 0))
+                self.usage["requests"] += 1
+                self.usage["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                self.usage["completion_tokens"] += usage.get("completion_tokens") or 0
+                return result
+
+    async def _read_stream(self, response, first_timeout, idle_timeout, on_delta=None) -> dict:
+        """读取SSE流式响应，组装成与非流式相同的结果结构"""
+        import aiohttp
+        parts = []
+        finish_reason = None
+        usage = {}
+        wait = first_timeout
+        while True:
+            try:
+                line = await asyncio.wait_for(response.content.readline(), wait)
+            except asyncio.TimeoutError:
+                raise StreamStalledError(f"流式响应超过 {wait:.0f} 秒没有新数据", "".join(parts))
+            except (aiohttp.ClientPayloadError, ValueError) as e:
+                # ValueError：单行超过 aiohttp 的读取上限，同样按中断的流处理
+                raise StreamStalledError(f"流式响应中断: {str(e)}", "".join(parts))
+            if not line:
+                break
+            wait = idle_timeout
+
+            line = line.decode("utf-8", errors="replace").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+
+            if chunk.get("usage"):
+                usage = chunk["usage"]
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    if on_delta:
+                        on_delta(delta)
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+
+        return {
+            "choices": [{
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        }
+
+    @staticmethod
+    def estimate_request_tokens(payload: dict) -> int:
+        """估算一次请求消耗的令牌数（输入+输出），用于令牌桶限速"""
+        prompt_tokens = sum(SubtitleProcessor.estimate_tokens(str(m.get("content", "")))
+                            for m in payload.get("messages", [])) + 1
+        # 未指定max_tokens时按输出与输入等长估算
+        return prompt_tokens + (payload.get("max_tokens") or prompt_tokens)
+        
+    async def chat(self, prompt, temperature=0.7, timeout=60):
+        """发送聊天请求，返回回复文本"""
+        messages = self.build_messages(prompt)
+        
+        print(f"发送API请求到: {self.api_base}/v1/chat/completions")
+        print(f"使用模型: {self.model}")
+        
+        # 打印完整的请求内容前30个字符
+        if isinstance(prompt, str):
+            print(f"请求内容前30个字符: {prompt[:30]}...")
+        elif isinstance(prompt, dict):
+            user_message = prompt.get("user_message", "")
+            print(f"用户请求内容前30个字符: {user_message[:30]}...")
+        else:
+            # 只打印用户消息
+            user_messages = [m for m in messages if m.get("role") == "user"]
+            if user_messages:
+                print(f"用户请求内容前30个字符: {user_messages[0].get('content', '')[:30]}...")
+        
+        try:
+            result = await self.chat_completion(messages, temperature=temperature, timeout=timeout)
+            if "choices" in result and result["choices"]:
+                response_text = result["choices"][0]["message"]["content"]
+                print(f"API响应前30个字符: {response_text[:30]}...")
+                return response_text
+            else:
+                print(f"API响应缺少内容: {result}")
+                raise Exception("API响应缺少内容")
+        except Exception as e:
+            print(f"API请求异常: {str(e)}")
+            raise Exception(f"API请求异常: {str(e)}")
+            
+    async def close(self):
+        """关闭会话"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+# 辅助函数：将秒数转换为时间码格式 (HH:MM:SS.MS)
+def format_timecode(seconds):
+    """
+    将秒数转换为时间码格式 (HH:MM:SS.MS)
+    
+    Args:
+        seconds: 秒数，可以是浮点数或整数
+        
+    Returns:
+        格式化的时间码字符串，格式为 HH:MM:SS.MS
+    """
+    seconds = float(seconds)  # 确保转换为浮点数
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = seconds % 60
+    return f"{hours:d}:{minutes:02d}:{seconds:06.3f}"